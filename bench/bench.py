@@ -0,0 +1,249 @@
+"""
+Offline benchmark for /add, /bulkadd, /session, /stats, /leaderboard, /cowsay and /cowchat.
+
+Drives the real cogs with fake interactions, a local fake Sheets server and a stub Gemini model
+(see fakes.py), and reports p50/p95/p99 latency per command and per stage. Run it from the
+repository root, e.g.:
+
+    python bench/bench.py --iterations 200 --sheets-latency 80 --tim-latency 600
+"""
+
+import argparse
+import asyncio
+import logging
+import math
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+
+from google.oauth2.credentials import Credentials
+
+import fakes
+from bot import init_bot
+from config import Config, ConfigWatcher, load_config
+from counters import WriteBehindCounter
+from journal import CritJournal
+from sheets import AsyncSheetsHandler
+from snapshot import SheetSnapshot, tracked_cells
+from stats import CritStats
+from tim import TimClient
+from utils import cowsay
+
+CONFIG_FILE = ROOT / "config.json"
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    """Returns the nearest-rank percentile of samples."""
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def time_cowsay() -> None:
+    """Records every cowsay render as a stage."""
+    render = cowsay.render
+
+    def timed_render(*args, **kwargs):
+        with fakes.timed("cowsay"):
+            return render(*args, **kwargs)
+
+    timed_render.cache_info = render.cache_info
+    cowsay.render = timed_render
+
+
+class Stack:
+    """The bot and its backends, wired up the way app.main does but against the fakes."""
+
+    def __init__(self, args: argparse.Namespace, config: Config) -> None:
+        self.args = args
+        self.config = config
+        self.server = fakes.FakeSheetsServer(args.sheets_latency / 1000)
+        for subsheet_id, cell in tracked_cells(config):
+            self.server.cells[(subsheet_id, cell)] = "0"
+        self.guild = fakes.FakeGuild(1)
+        self.bot = None
+        self.handler = None
+        self.sheets = None
+        self.counter = None
+        self.journal = None
+        self.snapshot = None
+        self.stats = None
+        # The journal lives here rather than at the configured path, so runs never touch real crits
+        self.journal_dir = tempfile.TemporaryDirectory()
+
+    async def start(self) -> None:
+        self.server.start()
+        sheets_config = self.config["sheets"]
+        handler = fakes.TimedSheetsHandler(
+            "bench",
+            Credentials(token="bench"),
+            pool_size=sheets_config["max_concurrency"],
+            api_endpoint=self.server.endpoint,
+        )
+        sheets = AsyncSheetsHandler(
+            handler,
+            max_concurrency=sheets_config["max_concurrency"],
+            read_quota=sheets_config["read_quota"],
+            write_quota=sheets_config["write_quota"],
+            max_retries=sheets_config["max_retries"],
+        )
+
+        self.snapshot = SheetSnapshot(sheets, self.config, sheets_config["snapshot_ttl"])
+        self.stats = CritStats(self.config, self.snapshot)
+        await self.snapshot.refresh()
+        self.handler = handler
+        self.sheets = self.sheet_handler(sheets)
+
+        tim_config = self.config["tim_config"]
+        tim = TimClient(
+            fakes.StubModel(self.args.tim_latency / 1000),
+            timeout=tim_config["timeout"],
+            max_concurrency=tim_config["max_concurrency"],
+            history_tokens=tim_config["history_tokens"],
+            summarize_history=tim_config["summarize_history"],
+            max_sessions=tim_config["max_sessions"],
+            crit_batch_window=0 if self.args.no_batching else tim_config["crit_batch_window"],
+        )
+        # The watcher is never started, the config file does not change during a run
+        watcher = ConfigWatcher(str(CONFIG_FILE), self.config)
+        self.bot = await init_bot(self.sheets, self.snapshot, self.stats, tim, self.config, watcher)
+
+        if self.args.voice:
+            await self.invoke("sounds", fakes.FakeInteraction(self.guild), "on")
+
+    def sheet_handler(self, sheets: AsyncSheetsHandler):
+        """Returns what the cogs increment cells through, as app.main chooses it."""
+        if self.args.write_through:
+            sheets.snapshot = self.snapshot
+            return sheets
+        if self.config["sheets"]["journal"]:
+            self.journal = CritJournal(os.path.join(self.journal_dir.name, "crits.db"))
+        self.counter = WriteBehindCounter(
+            sheets, self.snapshot, self.config["sheets"]["flush_interval"], self.journal
+        )
+        self.counter.start()
+        return self.counter
+
+    async def close(self) -> None:
+        if self.counter:
+            await self.counter.close()
+        if self.journal:
+            self.journal.close()
+        self.journal_dir.cleanup()
+        self.snapshot.close()
+        self.server.shutdown()
+
+    def interaction(self, channel_id: int = 1) -> fakes.FakeInteraction:
+        return fakes.FakeInteraction(
+            self.guild, channel_id=channel_id, latency=self.args.discord_latency / 1000
+        )
+
+    async def invoke(self, command: str, inter: fakes.FakeInteraction, *params) -> None:
+        """Runs a slash command's callback on its cog, as the command tree would."""
+        for cog in self.bot.cogs.values():
+            for app_command in cog.get_app_commands():
+                if app_command.name == command:
+                    await app_command.callback(cog, inter, *params)
+                    return
+        raise KeyError(f"No command named '{command}'")
+
+    def random_params(self, command: str) -> tuple:
+        """Returns typical arguments for a command."""
+        if command == "add":
+            return random.choice(list(self.config["crit_types"])), random.choice(list(self.config["characters"]))
+        if command == "session":
+            return (random.choice(self.config["campaigns"]),)
+        if command == "stats":
+            return (random.choice(list(self.config["characters"])),)
+        if command == "leaderboard":
+            return random.choice(self.config["campaigns"]), random.choice(list(self.config["crit_types"]))
+        if command == "bulkadd":
+            return (", ".join(
+                f"{name.lower()} {random.choice(list(self.config['crit_types']))} x{random.randint(1, 3)}"
+                for name in random.sample(list(self.config["characters"]), 4)
+            ),)
+        if command == "cowsay":
+            return ("The quick brown fox jumps over the lazy cow, who is not amused.",)
+        return ("How are you feeling today, Tim?",)
+
+    async def run_command(self, command: str, inter: fakes.FakeInteraction) -> None:
+        """Runs one command and records its total time and time to first response."""
+        token = fakes.current_command.set(command)
+        try:
+            with fakes.timed("total"):
+                await self.invoke(command, inter, *self.random_params(command))
+            if inter.responded_at is not None:
+                fakes.recorder.record("first_response", inter.responded_at - inter.created_at)
+        finally:
+            fakes.current_command.reset(token)
+
+
+def report(samples: dict[tuple[str, str], list[float]]) -> str:
+    """Formats recorded stage timings as a table of percentiles in milliseconds."""
+    lines = [f"{'command':<10} {'stage':<16} {'n':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"]
+    for (command, stage), values in sorted(samples.items()):
+        lines.append(
+            f"{command or '-':<10} {stage:<16} {len(values):>6} "
+            + " ".join(f"{percentile(values, p) * 1000:>9.2f}" for p in (50, 95, 99))
+        )
+    return "\n".join(lines)
+
+
+def build_parser(description: str) -> argparse.ArgumentParser:
+    """Returns a parser for the options shared by the benchmarks."""
+    parser = argparse.ArgumentParser(description=description, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sheets-latency", type=float, default=50, help="fake Sheets latency in ms")
+    parser.add_argument("--tim-latency", type=float, default=500, help="stub Gemini latency in ms")
+    parser.add_argument("--discord-latency", type=float, default=30, help="fake Discord API latency in ms")
+    parser.add_argument("--write-through", action="store_true", help="disable the write-behind counter")
+    parser.add_argument("--no-batching", action="store_true", help="disable crit notification batching")
+    parser.add_argument("--voice", action="store_true", help="join a fake voice channel (needs ffmpeg)")
+    parser.add_argument("--verbose", action="store_true", help="show the bot's own logs")
+    return parser
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = build_parser(__doc__)
+    parser.add_argument("--iterations", type=int, default=100, help="runs of each command")
+    parser.add_argument("--commands", default="add,session,cowsay,cowchat", help="comma-separated commands")
+    return parser.parse_args(argv)
+
+
+def setup(args: argparse.Namespace) -> Config:
+    """Prepares the process for a benchmark run and returns the bot's config."""
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    if args.voice and not shutil.which("ffmpeg"):
+        raise SystemExit("--voice needs ffmpeg on the PATH to decode the crit sounds")
+
+    os.chdir(ROOT)
+    time_cowsay()
+    return load_config(str(CONFIG_FILE))
+
+
+async def main(args: argparse.Namespace) -> None:
+    config = setup(args)
+    stack = Stack(args, config)
+    await stack.start()
+    fakes.recorder.clear()
+
+    try:
+        for command in args.commands.split(","):
+            started = time.perf_counter()
+            for _ in range(args.iterations):
+                await stack.run_command(command, stack.interaction())
+            logging.warning("Ran %d x /%s in %.2fs.", args.iterations, command, time.perf_counter() - started)
+    finally:
+        await stack.close()
+
+    print(report(fakes.recorder.samples))
+    print(f"\nSheets requests: {stack.server.requests}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
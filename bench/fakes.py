@@ -0,0 +1,322 @@
+"""
+Local stand-ins for Discord, Google Sheets and Gemini, used by the benchmarks to drive the cogs
+without network access. Latencies are configurable so that slow backends can be simulated.
+"""
+
+import asyncio
+import contextvars
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+import discord
+
+from sheets import SheetsHandler
+
+# The command being benchmarked, so stage timings can be attributed to it
+current_command: contextvars.ContextVar[str] = contextvars.ContextVar("current_command", default="")
+
+
+class StageRecorder:
+    """Collects durations in seconds per (command, stage)."""
+
+    def __init__(self) -> None:
+        self.samples: dict[tuple[str, str], list[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float, command: str | None = None) -> None:
+        key = (command or current_command.get(), stage)
+        with self._lock:
+            self.samples.setdefault(key, []).append(seconds)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.samples.clear()
+
+
+recorder = StageRecorder()
+
+
+class timed:
+    """Context manager recording the duration of its body as a stage."""
+
+    def __init__(self, stage: str) -> None:
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        recorder.record(self.stage, time.perf_counter() - self.start)
+
+
+_A1 = re.compile(r"([A-Z]+)(\d+)")
+
+
+def _cells(range_name: str) -> tuple[str, list[list[str]]]:
+    """Expands a 'Subsheet!B2:C4' range into its subsheet and a grid of cell names."""
+    subsheet_id, _, a1 = range_name.partition("!")
+    start, _, end = a1.partition(":")
+    (start_col, start_row), (end_col, end_row) = _A1.fullmatch(start).groups(), _A1.fullmatch(end or start).groups()
+    cols = [chr(c) for c in range(ord(start_col), ord(end_col) + 1)]
+    return subsheet_id, [[f"{col}{row}" for col in cols] for row in range(int(start_row), int(end_row) + 1)]
+
+
+class FakeSheetsServer(ThreadingHTTPServer):
+    """
+    Minimal Sheets v4 values API over local HTTP: get, update, batchGet and batchUpdate.
+    Every request sleeps for latency seconds before answering.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, latency: float = 0.0) -> None:
+        super().__init__(("127.0.0.1", 0), _FakeSheetsRequestHandler)
+        self.latency = latency
+        self.cells: dict[tuple[str, str], str] = {}
+        self.requests: dict[str, int] = {}
+        self.lock = threading.Lock()
+
+    @property
+    def endpoint(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/"
+
+    def start(self) -> None:
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    def read(self, range_name: str) -> dict:
+        subsheet_id, grid = _cells(range_name)
+        with self.lock:
+            values = [[self.cells.get((subsheet_id, cell), "") for cell in row] for row in grid]
+        return {"range": range_name, "values": values}
+
+    def write(self, range_name: str, values: list[list]) -> int:
+        subsheet_id, grid = _cells(range_name)
+        with self.lock:
+            for row, row_values in zip(grid, values):
+                for cell, value in zip(row, row_values):
+                    self.cells[(subsheet_id, cell)] = str(value)
+        return sum(len(row) for row in values)
+
+
+class _FakeSheetsRequestHandler(BaseHTTPRequestHandler):
+    server: FakeSheetsServer
+    # Keep-alive, so the Sheets client's pooled connections are reused as they would be against Google
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def _reply(self, body: dict) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _handle(self, method: str) -> None:
+        time.sleep(self.server.latency)
+        url = urlparse(self.path)
+        action = unquote(url.path.rsplit("/", 1)[1])
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        with self.server.lock:
+            self.server.requests[action.partition(":")[2] or method] = (
+                self.server.requests.get(action.partition(":")[2] or method, 0) + 1
+            )
+
+        if action == "values:batchGet":
+            ranges = parse_qs(url.query)["ranges"]
+            self._reply({"valueRanges": [self.server.read(r) for r in ranges]})
+        elif action == "values:batchUpdate":
+            updated = sum(self.server.write(d["range"], d["values"]) for d in body["data"])
+            self._reply({"totalUpdatedCells": updated})
+        elif method == "GET":
+            self._reply(self.server.read(action))
+        else:
+            self._reply({"updatedCells": self.server.write(action, body["values"])})
+
+    def do_GET(self) -> None:
+        self._handle("GET")
+
+    def do_PUT(self) -> None:
+        self._handle("PUT")
+
+    def do_POST(self) -> None:
+        self._handle("POST")
+
+
+class TimedSheetsHandler(SheetsHandler):
+    """SheetsHandler that records the duration of every read and write as a stage."""
+
+    def get_values(self, *args):
+        with timed("sheets_read"):
+            return super().get_values(*args)
+
+    def batch_get_values(self, *args):
+        with timed("sheets_read"):
+            return super().batch_get_values(*args)
+
+    def update_values(self, *args):
+        with timed("sheets_write"):
+            return super().update_values(*args)
+
+    def batch_update_values(self, *args):
+        with timed("sheets_write"):
+            return super().batch_update_values(*args)
+
+
+class _StubResponse:
+    def __init__(self, text: str) -> None:
+        self.text = text
+
+
+class StubChat:
+    """Stand-in for a Gemini chat session that answers after latency seconds."""
+
+    def __init__(self, latency: float) -> None:
+        self.latency = latency
+        self.history: list = []
+
+    async def send_message_async(self, message: str) -> _StubResponse:
+        with timed("tim"):
+            await asyncio.sleep(self.latency)
+        return _StubResponse(f"Moo! I heard you say: {message}")
+
+
+class StubModel:
+    """Stand-in for the Gemini model returned by app.init_model."""
+
+    def __init__(self, latency: float = 0.0) -> None:
+        self.latency = latency
+
+    def start_chat(self) -> StubChat:
+        return StubChat(self.latency)
+
+    async def generate_content_async(self, prompt: str) -> _StubResponse:
+        await asyncio.sleep(self.latency)
+        return _StubResponse("They talked about crits.")
+
+
+class FakeMessage:
+    def __init__(self, latency: float) -> None:
+        self.latency = latency
+
+    async def edit(self, **kwargs) -> "FakeMessage":
+        with timed("discord_edit"):
+            await asyncio.sleep(self.latency)
+        return self
+
+
+class FakeResponse:
+    """Stand-in for discord.InteractionResponse."""
+
+    def __init__(self, inter: "FakeInteraction") -> None:
+        self.inter = inter
+        self.done = False
+
+    def _respond(self) -> None:
+        if self.done:
+            raise discord.InteractionResponded(self.inter)
+        self.done = True
+        self.inter.responded_at = time.perf_counter()
+
+    async def defer(self, **kwargs) -> None:
+        self._respond()
+        await asyncio.sleep(self.inter.latency)
+
+    async def send_message(self, *args, **kwargs) -> None:
+        self._respond()
+        with timed("discord_send"):
+            await asyncio.sleep(self.inter.latency)
+
+
+class FakeFollowup:
+    """Stand-in for the interaction's followup webhook."""
+
+    def __init__(self, inter: "FakeInteraction") -> None:
+        self.inter = inter
+
+    async def send(self, *args, **kwargs) -> FakeMessage:
+        with timed("discord_send"):
+            await asyncio.sleep(self.inter.latency)
+        return FakeMessage(self.inter.latency)
+
+
+class FakeVoiceClient:
+    """Stand-in for a voice connection that records when each sound starts playing."""
+
+    def __init__(self, channel) -> None:
+        self.channel = channel
+        self.started_at = time.perf_counter()
+
+    def play(self, source, after=None) -> None:
+        recorder.record("sound_start", time.perf_counter() - self.started_at)
+
+    def is_playing(self) -> bool:
+        return False
+
+    async def disconnect(self, force: bool = False) -> None:
+        self.channel.guild.voice_client = None
+
+
+class FakeVoiceChannel:
+    def __init__(self, guild: "FakeGuild") -> None:
+        self.guild = guild
+
+    async def connect(self) -> FakeVoiceClient:
+        self.guild.voice_client = FakeVoiceClient(self)
+        return self.guild.voice_client
+
+    def __str__(self) -> str:
+        return "bench-voice"
+
+
+class FakeGuild:
+    def __init__(self, guild_id: int) -> None:
+        self.id = guild_id
+        self.voice_client: FakeVoiceClient | None = None
+        self.voice_channel = FakeVoiceChannel(self)
+
+    def __str__(self) -> str:
+        return f"bench-guild-{self.id}"
+
+
+class _FakeVoiceState:
+    def __init__(self, channel: FakeVoiceChannel) -> None:
+        self.channel = channel
+
+
+class FakeUser:
+    def __init__(self, name: str, guild: FakeGuild | None) -> None:
+        self.display_name = name
+        self.voice = _FakeVoiceState(guild.voice_channel) if guild else None
+
+
+class FakeInteraction:
+    """
+    Stand-in for discord.Interaction with the attributes the cogs use.
+    Every Discord API call sleeps for latency seconds.
+    """
+
+    def __init__(self, guild: FakeGuild | None = None, channel_id: int = 1, user: str = "Bench (Runner)",
+                 latency: float = 0.0) -> None:
+        self.guild = guild
+        self.guild_id = guild.id if guild else None
+        self.channel_id = channel_id
+        self.user = FakeUser(user, guild)
+        self.latency = latency
+        self.created_at = time.perf_counter()
+        self.responded_at: float | None = None
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
+
+    async def edit_original_response(self, **kwargs) -> FakeMessage:
+        with timed("discord_send"):
+            await asyncio.sleep(self.latency)
+        return FakeMessage(self.latency)
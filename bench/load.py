@@ -0,0 +1,198 @@
+"""
+Offline load test for /add, /session and /cowchat.
+
+Fires bursts of simultaneous interactions at the real cogs, against the same stand-in backends
+as bench.py, with the burst size rising level by level. For each level it reports throughput,
+event loop lag, errors, crits lost by increment_cell (checked against the fake sheet) and how
+many interactions were not answered within Discord's 3 second defer window. Run it from the
+repository root, e.g.:
+
+    python bench/load.py --bursts 1,8,32,128 --guild-channels 4 --sheets-latency 80
+
+--naive increments cells with a plain read and write per call, as the bot did before
+increments were coalesced, to show where unguarded increments start losing crits.
+"""
+
+import asyncio
+import logging
+import random
+import time
+
+from bench import Stack, build_parser, percentile, setup
+
+import fakes
+
+DEFER_WINDOW = 3.0
+
+
+class NaiveIncrementer:
+    """Increments cells with an unguarded read and write per call, in a worker thread."""
+
+    def __init__(self, handler) -> None:
+        self.handler = handler
+
+    async def increment_cell(self, cell, subsheet_id) -> int:
+        return await asyncio.to_thread(self.handler.increment_cell, cell, subsheet_id)
+
+
+class LoadStack(Stack):
+    def sheet_handler(self, sheets):
+        if self.args.naive:
+            return NaiveIncrementer(self.handler)
+        return super().sheet_handler(sheets)
+
+
+class LagMonitor:
+    """Measures how late the event loop wakes from short sleeps while running."""
+
+    def __init__(self, interval: float = 0.01) -> None:
+        self.interval = interval
+        self.samples: list[float] = []
+        self._task: asyncio.Task | None = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append(loop.time() - start - self.interval)
+
+    def start(self) -> None:
+        self.samples = []
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self) -> None:
+        self._task.cancel()
+
+
+class Burst:
+    """The outcome of one burst of interactions."""
+
+    def __init__(self) -> None:
+        self.latencies: list[float] = []
+        self.late = 0
+        self.errors = 0
+        # Increments per (subsheet, cell) whose command completed
+        self.increments: dict[tuple[str, str], int] = {}
+        self.lost = 0
+
+
+def pick_command(stack: LoadStack, mix: dict[str, float]) -> tuple[str, tuple, tuple[str, str] | None]:
+    """Picks a command by weight and returns it with its arguments and the cell it increments."""
+    command = random.choices(list(mix), weights=list(mix.values()))[0]
+    params = stack.random_params(command)
+    if command == "add":
+        crit_type, char_name = params
+        char_info = stack.config.characters[char_name]
+        return command, params, (char_info.sheet, char_info.cells[crit_type])
+    if command == "session":
+        return command, params, (params[0].title(), "H2")
+    return command, params, None
+
+
+async def run_one(stack: LoadStack, burst: Burst, command: str, params: tuple, cell, inter) -> None:
+    token = fakes.current_command.set(command)
+    try:
+        await stack.invoke(command, inter, *params)
+    except Exception as e:
+        burst.errors += 1
+        logging.warning("/%s failed: %r", command, e)
+        return
+    finally:
+        fakes.current_command.reset(token)
+
+    burst.latencies.append(time.perf_counter() - inter.created_at)
+    if inter.responded_at is None or inter.responded_at - inter.created_at > DEFER_WINDOW:
+        burst.late += 1
+    if cell:
+        burst.increments[cell] = burst.increments.get(cell, 0) + 1
+
+
+async def settle(stack: LoadStack) -> None:
+    """Writes any counts still held by the write-behind counter to the fake sheet."""
+    if stack.counter:
+        await stack.counter.flush()
+
+
+def sheet_counts(stack: LoadStack) -> dict[tuple[str, str], int]:
+    with stack.server.lock:
+        return {key: int(value or 0) for key, value in stack.server.cells.items()}
+
+
+async def run_burst(stack: LoadStack, size: int, mix: dict[str, float], lag: LagMonitor) -> tuple[Burst, float]:
+    """Fires size interactions at once, spread over the guild's channels, and waits for all of them."""
+    await settle(stack)
+    before = sheet_counts(stack)
+    burst = Burst()
+
+    jobs = []
+    for i in range(size):
+        command, params, cell = pick_command(stack, mix)
+        inter = stack.interaction(channel_id=i % stack.args.guild_channels + 1)
+        jobs.append(run_one(stack, burst, command, params, cell, inter))
+
+    lag.start()
+    started = time.perf_counter()
+    await asyncio.gather(*jobs)
+    elapsed = time.perf_counter() - started
+    lag.stop()
+
+    await settle(stack)
+    after = sheet_counts(stack)
+    burst.lost = sum(
+        max(0, count - (after.get(key, 0) - before.get(key, 0))) for key, count in burst.increments.items()
+    )
+    return burst, elapsed
+
+
+def report_row(size: int, burst: Burst, elapsed: float, lag: list[float]) -> str:
+    done = len(burst.latencies)
+    return (
+        f"{size:>6} {done / elapsed:>8.1f} "
+        + " ".join(f"{percentile(burst.latencies, p) * 1000:>9.0f}" for p in (50, 99))
+        + f" {percentile(lag, 99) * 1000 if lag else 0:>9.1f} {max(lag, default=0) * 1000:>9.1f}"
+        + f" {burst.late:>6} {burst.errors:>6} {burst.lost:>6}"
+    )
+
+
+def parse_args(argv: list[str] | None = None):
+    parser = build_parser(__doc__)
+    parser.add_argument("--bursts", default="1,2,4,8,16,32,64,128", help="comma-separated burst sizes")
+    parser.add_argument("--repeat", type=int, default=3, help="bursts fired at each size")
+    parser.add_argument("--mix", default="add=6,session=1,cowchat=3", help="command weights, e.g. add=6,session=1")
+    parser.add_argument("--guild-channels", type=int, default=4, help="channels the interactions are spread over")
+    parser.add_argument("--naive", action="store_true", help="increment cells without coalescing or write-behind")
+    return parser.parse_args(argv)
+
+
+async def main(args) -> None:
+    config = setup(args)
+    mix = {command: float(weight) for command, _, weight in (m.partition("=") for m in args.mix.split(","))}
+    stack = LoadStack(args, config)
+    await stack.start()
+    lag = LagMonitor()
+
+    print(
+        f"{'burst':>6} {'cmds/s':>8} {'p50 ms':>9} {'p99 ms':>9} {'lag p99':>9} {'lag max':>9}"
+        f" {'late':>6} {'errors':>6} {'lost':>6}"
+    )
+    saturated = None
+    try:
+        for size in map(int, args.bursts.split(",")):
+            for _ in range(args.repeat):
+                burst, elapsed = await run_burst(stack, size, mix, lag)
+                print(report_row(size, burst, elapsed, lag.samples))
+                if saturated is None and (burst.late or burst.lost or burst.errors):
+                    saturated = size
+    finally:
+        await stack.close()
+
+    print(f"\nSheets requests: {stack.server.requests}")
+    if saturated is None:
+        print("No crits lost and no interaction missed the defer window at any burst size.")
+    else:
+        print(f"Crits were lost or interactions missed the defer window from a burst of {saturated}.")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -5,9 +5,9 @@ initializes the GenAI model, and starts the Discord bot.
 """
 
 import asyncio
-import json
 import logging
-from logging.handlers import RotatingFileHandler
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from os import getenv, path
 import colorlog
 from dotenv import load_dotenv
@@ -18,15 +18,53 @@ from google.auth.external_account_authorized_user import (
 )
 from google.auth.transport.requests import Request
 from google_auth_oauthlib.flow import InstalledAppFlow
-from sheets import SheetsHandler
+from config import ConfigWatcher, load_config
+from sheets import SheetsHandler, AsyncSheetsHandler
+from snapshot import SheetSnapshot
+from stats import CritStats
+from counters import WriteBehindCounter
+from credentials import CredentialRefresher
+from journal import CritJournal
+from tim import TimClient
 from bot import init_bot
+from utils.metrics import start_server as start_metrics_server
+from utils.watchdog import LoopWatchdog
 
 
-def init_logs():
+# Log levels per profile, chosen with the LOG_PROFILE environment variable
+LOG_PROFILES = {
+    "debug": {"root": logging.DEBUG, "console": logging.DEBUG, "libraries": logging.INFO},
+    "production": {"root": logging.INFO, "console": logging.WARNING, "libraries": logging.WARNING},
+}
+DEFAULT_LOG_PROFILE = "debug"
+
+
+class LazyQueueHandler(QueueHandler):
+    """
+    QueueHandler that leaves formatting to the listener's thread. The stock handler formats
+    every record before queueing it, which is the expensive part of logging.
+
+    Records are queued as is, so objects passed as log arguments should not be changed after
+    logging them.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def init_logs() -> QueueListener:
     """
     Initializes logging for the application, setting up both file and console handlers
     with appropriate formatting and log levels.
+
+    Log calls only put the record on a queue; a background thread formats and writes it, so
+    neither formatting nor file I/O happens on the event loop. Records below the profile's
+    levels are dropped before a record is even created.
+
+    :return: The listener writing the records, to be stopped on shutdown to flush the queue.
     """
+    profile_name = getenv("LOG_PROFILE", DEFAULT_LOG_PROFILE)
+    profile = LOG_PROFILES.get(profile_name, LOG_PROFILES[DEFAULT_LOG_PROFILE])
     fmt = "%(asctime)s - %(levelname)s - %(message)s - %(name)s"
     datefmt = "%Y-%m-%d %H:%M:%S"
 
@@ -34,6 +72,7 @@ def init_logs():
     file_handler.setFormatter(logging.Formatter(fmt=fmt, datefmt=datefmt))
 
     console_handler = colorlog.StreamHandler()
+    console_handler.setLevel(profile["console"])
     console_handler.setFormatter(
         colorlog.ColoredFormatter(
             fmt="%(log_color)s" + fmt,
@@ -48,14 +87,26 @@ def init_logs():
         )
     )
 
-    logging.basicConfig(level=logging.DEBUG, handlers=[file_handler, console_handler])
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    logging.basicConfig(level=profile["root"], handlers=[LazyQueueHandler(log_queue)])
+    listener.start()
 
     # Prevent discord and google-oauth loggers from spamming the logs with debug info
-    logging.getLogger("discord").setLevel(logging.INFO)
-    logging.getLogger("requests_oauthlib.oauth2_session").setLevel(logging.INFO)
+    logging.getLogger("discord").setLevel(profile["libraries"])
+    logging.getLogger("requests_oauthlib.oauth2_session").setLevel(profile["libraries"])
+
+    if profile_name not in LOG_PROFILES:
+        logging.warning(
+            "Unknown LOG_PROFILE '%s', using '%s'. Valid profiles: %s.",
+            profile_name,
+            DEFAULT_LOG_PROFILE,
+            ", ".join(LOG_PROFILES),
+        )
+    return listener
 
 
-def init_model(tim_config: dict, gemini_key: str) -> genai.ChatSession:
+def init_model(tim_config: dict, gemini_key: str) -> genai.GenerativeModel:
     """
     Initializes the GenAI model (Tim) with the provided configuration and API key.
 
@@ -72,38 +123,13 @@ def init_model(tim_config: dict, gemini_key: str) -> genai.ChatSession:
                 temperature=tim_config["temperature"]
             ),
         )
-        tim_chat = tim.start_chat()
         logging.info("Tim genai model initialized successfully.")
-        return tim_chat
+        return tim
     except Exception as e:
         logging.error("Failed to initialize Tim model: %s", e)
         raise e
 
 
-def load_config(config_file: str) -> Any:
-    """
-    Loads the configuration from a JSON file, logging the number of characters and crit types loaded.
-
-    :param config_file: Path to the JSON configuration file
-    :return: Configuration dictionary loaded from the file
-    """
-    try:
-        with open(config_file, encoding="UTF-8") as f:
-            config = json.load(f)
-        logging.info("Config for %d characters loaded.", len(config["characters"]))
-        logging.info("Config for %d crit types loaded.", len(config["crit_types"]))
-        return config
-    except FileNotFoundError as e:
-        logging.error("Config file not found: %s", config_file)
-        raise e
-    except json.JSONDecodeError as e:
-        logging.error("Failed to parse JSON in config file: %s", config_file)
-        raise e
-    except Exception as e:
-        logging.error("Unexpected error while loading config: %s", e)
-        raise e
-
-
 def load_google_credentials(
         credentials_file: str, token_file: str
 ) -> Credentials | ExternalAccountCredentials:
@@ -170,25 +196,86 @@ async def main() -> None:
     sets up the GenAI model, and starts the Discord bot. Handles exceptions gracefully, logging
     critical errors and exiting if initialization fails.
     """
+    load_dotenv()
+    log_listener = init_logs()
     try:
-        init_logs()
-        load_dotenv()
-        config = load_config("./config.json")
-
-        google_creds = load_google_credentials("./credentials.json", "./token.json")
-        sheets = SheetsHandler(getenv("SHEET_ID"), google_creds)
+        config_file = "./config.json"
+        config = load_config(config_file)
+
+        watchdog = LoopWatchdog(config["watchdog"]["interval"], config["watchdog"]["threshold"])
+        watchdog.start()
+
+        token_file = "./token.json"
+        google_creds = load_google_credentials("./credentials.json", token_file)
+        sheets_config = config["sheets"]
+        max_concurrency = sheets_config["max_concurrency"]
+        sheets = AsyncSheetsHandler(
+            SheetsHandler(getenv("SHEET_ID"), google_creds, pool_size=max_concurrency),
+            max_concurrency=max_concurrency,
+            read_quota=sheets_config["read_quota"],
+            write_quota=sheets_config["write_quota"],
+            max_retries=sheets_config["max_retries"],
+        )
+        refresher = CredentialRefresher(sheets.handler, token_file, sheets_config["refresh_margin"])
+        refresher.start()
+        snapshot = SheetSnapshot(sheets, config, sheets_config["snapshot_ttl"])
+        stats = CritStats(config, snapshot)
+        await snapshot.refresh()
+        snapshot.start()
+        if sheets_config["write_behind"]:
+            journal = CritJournal(sheets_config["journal"]) if sheets_config["journal"] else None
+            counter = WriteBehindCounter(sheets, snapshot, sheets_config["flush_interval"], journal)
+            if replayed := await counter.replay():
+                logging.warning("Replayed %d increments that had not reached the spreadsheet.", replayed)
+            counter.start()
+        else:
+            sheets.snapshot = snapshot
+            journal = counter = None
+
+        tim_config = config["tim_config"]
+        tim = TimClient(
+            init_model(tim_config, getenv("GEMINI_KEY")),
+            timeout=tim_config["timeout"],
+            max_concurrency=tim_config["max_concurrency"],
+            history_tokens=tim_config["history_tokens"],
+            summarize_history=tim_config["summarize_history"],
+            max_sessions=tim_config["max_sessions"],
+            crit_batch_window=tim_config["crit_batch_window"],
+        )
 
-        tim_chat = init_model(config["tim_config"], getenv("GEMINI_KEY"))
+        watcher = ConfigWatcher(config_file, config)
+        # The snapshot must load any new cells before the stats are rebuilt from it
+        watcher.listeners.extend([snapshot.reconfigure, stats.reconfigure])
+        bot = await init_bot(counter or sheets, snapshot, stats, tim, config, watcher)
+        watcher.start()
 
-        bot = await init_bot(sheets, tim_chat, getenv("PWSH_PATH"), config)
+        metrics_config = config["metrics"]
+        metrics_runner = None
+        if metrics_config["enabled"]:
+            metrics_runner = await start_metrics_server(metrics_config["host"], metrics_config["port"])
 
         if discord_token := getenv("DISCORD_TOKEN"):
-            await bot.start(discord_token)
+            try:
+                await bot.start(discord_token)
+            finally:
+                watcher.close()
+                refresher.close()
+                snapshot.close()
+                if counter:
+                    await counter.close()
+                if journal:
+                    journal.close()
+                sheets.close()
+                if metrics_runner:
+                    await metrics_runner.cleanup()
+                watchdog.stop()
         else:
             raise Exception("DISCORD_TOKEN not found")
     except Exception as e:
         logging.critical("Critical error in main execution: %s", e, exc_info=True)
         exit(1)
+    finally:
+        log_listener.stop()
 
 
 if __name__ == "__main__":
@@ -5,22 +5,34 @@ necessary configurations for the bot to run.
 
 import logging
 import discord
+from discord import app_commands
 from discord.ext import commands
 
 from cogs.core_cog import CoreCog
 from cogs.crit_cog import CritCog
 from cogs.chat_cog import ChatCog
 from cogs.voice_cog import VoiceCog
+from utils.watchdog import label_current_task
 
 
-async def init_bot(sheet_handler, tim_chat, pwsh_path, config):
+class CritTree(app_commands.CommandTree):
+    async def interaction_check(self, inter: discord.Interaction) -> bool:
+        """Labels the task running each slash command, for the loop watchdog's stall reports"""
+        if inter.command:
+            label_current_task(f"/{inter.command.name} from '{inter.user.display_name}'")
+        return True
+
+
+async def init_bot(sheet_handler, snapshot, stats, tim, config, watcher):
     """
     Initializes the Discord bot with the specified cogs and configurations.
 
-    :param sheet_handler: SheetsHandler instance for interacting with Google Sheets
-    :param tim_chat: Tim chat instance for GenAI responses
-    :param pwsh_path: Path to PowerShell executable
-    :param config: Configuration dictionary for the bot
+    :param sheet_handler: AsyncSheetsHandler or WriteBehindCounter used to increment cells
+    :param snapshot: SheetSnapshot holding the current values of all tracked cells
+    :param stats: CritStats kept up to date from the snapshot, for stats and leaderboards
+    :param tim: TimClient used for GenAI responses, with one chat session per channel
+    :param config: Compiled configuration for the bot
+    :param watcher: ConfigWatcher, which hands reloaded configs to the cogs
     """
     intents = discord.Intents.default()
     intents.message_content = True
@@ -32,13 +44,21 @@ async def init_bot(sheet_handler, tim_chat, pwsh_path, config):
         intents=intents,
         description="This bot will add crits directly to the spreadsheet for you!",
         help_command=commands.DefaultHelpCommand(no_category="Commands"),
+        tree_cls=CritTree,
     )
+
+    @bot.before_invoke
+    async def label_command(ctx: commands.Context) -> None:
+        label_current_task(f"${ctx.command.name} from '{ctx.author}'")
     logging.info("Discord bot instance created successfully.")
 
     await bot.add_cog(CoreCog(bot))
-    await bot.add_cog(CritCog(bot, sheet_handler, tim_chat, pwsh_path, config))
-    await bot.add_cog(ChatCog(bot, tim_chat, pwsh_path))
-    await bot.add_cog(VoiceCog(bot))
+    crit_cog = CritCog(bot, sheet_handler, snapshot, stats, tim, config)
+    voice_cog = VoiceCog(bot, config)
+    await bot.add_cog(crit_cog)
+    await bot.add_cog(ChatCog(bot, tim))
+    await bot.add_cog(voice_cog)
+    watcher.listeners.extend([crit_cog.apply_config, voice_cog.apply_config])
     logging.info("Cogs loaded successfully.")
 
     return bot
@@ -8,14 +8,14 @@ import discord
 from discord import app_commands
 from discord.ext import commands
 
-from utils.helpers import get_msg_author_name, cow_format, talk_to_tim
+from utils.helpers import get_msg_author_name, get_chat_key, cow_format
+from utils.metrics import metrics
 
 
 class ChatCog(commands.Cog):
-    def __init__(self, bot, tim_chat, pwsh_path) -> None:
+    def __init__(self, bot, tim) -> None:
         self.bot = bot
-        self.tim_chat = tim_chat
-        self.pwsh_path = pwsh_path
+        self.tim = tim
 
     @app_commands.command(name="cowsay", description="Get a cow to say something for you.")
     async def cowsay(
@@ -30,8 +30,9 @@ class ChatCog(commands.Cog):
         :param message: What you want the cow to say.
         """
         logging.info("Received 'cowsay' command from user '%s'.", inter.user.display_name)
-        formatted_message = cow_format(message, self.pwsh_path)
-        await inter.response.send_message(f"```{formatted_message}```")
+        formatted_message = cow_format(message)
+        with metrics.timer("discord_send"):
+            await inter.response.send_message(f"```{formatted_message}```")
         logging.info("Formatted cow message sent to user '%s'.", inter.user.display_name)
 
     @app_commands.command(name="cowchat", description="Have a chat with Tim the Magic Cow!")
@@ -46,7 +47,8 @@ class ChatCog(commands.Cog):
         :param inter: discord.Interaction instance
         :param message: What you want to say to Tim
         """
-        await inter.response.defer()  # defer because the model can take longer than 3 second limit
+        with metrics.timer("defer"):
+            await inter.response.defer()  # defer because the model can take longer than 3 second limit
 
         logging.info(
             "Received 'cowchat' command from user '%s'. message=%s", inter.user.display_name, message
@@ -61,11 +63,13 @@ class ChatCog(commands.Cog):
 
         name = get_msg_author_name(inter)
         logging.info("Sending message to Tim the cow from user '%s', display name '%s.", inter.user.display_name, name)
-        response = talk_to_tim(message, name, self.tim_chat)
+        response = await self.tim.talk(message, name, get_chat_key(inter))
         logging.info("Received response from Tim the cow.")
 
-        await inter.followup.send(embed=(discord.Embed(
+        embed = discord.Embed(
             title="Tim says...",
-            description=f"{name} said to Tim: \"{message}\"\n```{cow_format(response, self.pwsh_path)}```",
-        )))
+            description=f"{name} said to Tim: \"{message}\"\n```{cow_format(response)}```",
+        )
+        with metrics.timer("discord_send"):
+            await inter.followup.send(embed=embed)
         logging.info("Formatted cow message sent to user '%s'.", inter.user.display_name)
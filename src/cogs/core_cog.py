@@ -1,10 +1,18 @@
 """
 Handles core bot events and functionality, such as setting the bot's status on startup.
 """
+import asyncio
+import io
 import logging
+import threading
 import discord
 from discord.ext import commands
 
+from utils.metrics import metrics
+from utils.profiler import SamplingProfiler
+
+MAX_PROFILE_SECONDS = 120
+
 
 class CoreCog(commands.Cog):
     def __init__(self, bot) -> None:
@@ -26,14 +34,43 @@ class CoreCog(commands.Cog):
         synced = await ctx.bot.tree.sync()
         await ctx.send(f"Synced {len(synced)} commands globally")
 
+    @commands.command(name="metrics")
+    @commands.is_owner()
+    @commands.dm_only()
+    async def metrics_summary(self, ctx: commands.Context) -> None:
+        """Show recent latency of each stage of handling commands"""
+        await ctx.send(f"```{metrics.summary()}```")
+
+    @commands.command()
+    @commands.is_owner()
+    @commands.max_concurrency(1)
+    @commands.dm_only()
+    async def profile(self, ctx: commands.Context, seconds: float = 10) -> None:
+        """Profile the running bot for a number of seconds"""
+        seconds = min(max(seconds, 1), MAX_PROFILE_SECONDS)
+        await ctx.send(f"Profiling for {seconds:g} seconds...")
+        logging.info("Profiling for %g seconds for '%s'.", seconds, ctx.author)
+
+        # Commands run on the event loop's thread, which is the one worth profiling
+        profiler = SamplingProfiler(threading.get_ident())
+        await asyncio.to_thread(profiler.run, seconds)
+        dump = discord.File(io.BytesIO(profiler.collapsed().encode()), filename="profile.collapsed.txt")
+        await ctx.send(f"```{profiler.top()[:1990]}```", file=dump)
+
     @sync.error
-    async def sync_error(self, ctx: commands.Context, error: commands.CommandError) -> None:
-        """Handle errors in sync command"""
+    @metrics_summary.error
+    @profile.error
+    async def owner_command_error(self, ctx: commands.Context, error: commands.CommandError) -> None:
+        """Handle errors in owner commands"""
         if isinstance(error, commands.CommandOnCooldown):
-            await ctx.send(f"Sync is on cooldown for {error.retry_after:.1f} seconds", ephemeral=True)
+            await ctx.send(
+                f"{ctx.command.name.title()} is on cooldown for {error.retry_after:.1f} seconds", ephemeral=True
+            )
         elif isinstance(error, commands.NotOwner):
             await ctx.send("You are not the owner of this bot.", ephemeral=True)
         elif isinstance(error, commands.PrivateMessageOnly):
             await ctx.send("You can only use this command in private messages.", ephemeral=True)
+        elif isinstance(error, commands.MaxConcurrencyReached):
+            await ctx.send(f"{ctx.command.name.title()} is already running.", ephemeral=True)
         else:
             await ctx.send(f"Unknown error: {error}", ephemeral=True)
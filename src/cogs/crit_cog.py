@@ -1,28 +1,72 @@
 """
 Handles commands related to tracking critical hits on the spreadsheet,
-such as adding crits and incrementing session numbers.
+such as adding crits, incrementing session numbers and showing crit stats.
 """
 
+import asyncio
 import random
+import re
 import logging
 from typing import Literal
 
 import discord
 from discord import app_commands
 from discord.ext import commands
+from googleapiclient.errors import HttpError
 from num2words import num2words
 
+from config import Character, Config, CritType
+from scheduler import INTERACTIVE
+
 from utils.helpers import (
     send_error_embed,
-    play_sound,
     get_msg_author_name,
-    talk_to_tim,
+    get_chat_key,
     cow_format,
 )
+from utils.metrics import metrics
 
 happy_emoji = list("😀😁😃😄😆😉😊😋😎😍🙂🤗🤩😏")
 sad_emoji = list("😞😒😟😠🙁😣😖😨😰😧😢😥😭😵‍💫")
 
+MAX_BULK_COUNT = 50
+
+
+def parse_bulk_entries(
+        entries: str, characters: dict[str, Character], crit_types: dict[str, CritType]
+) -> tuple[dict[tuple[str, str], int], list[str]]:
+    """
+    Parses crit entries like "zohar 20 x3, morbo 1" for /bulkadd. Entries are separated by
+    commas, semicolons or new lines, and each is a character, a crit type and an optional
+    count (1 by default), written as "3" or "x3". Repeated entries are added together.
+
+    :param entries: The entries as typed by the user.
+    :param characters: The characters from the config, keyed by upper case name.
+    :param crit_types: The crit types from the config.
+    :return: The count per (character, crit type), and a message for each invalid entry.
+    """
+    counts: dict[tuple[str, str], int] = {}
+    errors = []
+    for entry in re.split(r"[,;\n]", entries):
+        parts = entry.split()
+        if not parts:
+            continue
+        if len(parts) not in (2, 3):
+            errors.append(f"'{entry.strip()}' should be a character and a crit type, optionally followed by a count.")
+            continue
+
+        char_name, crit_type = parts[0].upper(), parts[1]
+        count = parts[2].lower().removeprefix("x") if len(parts) == 3 else "1"
+        if char_name not in characters:
+            errors.append(f"Unknown character '{parts[0]}'.")
+        elif crit_type not in crit_types:
+            errors.append(f"Unknown crit type '{crit_type}' for {parts[0]}.")
+        elif not count.isdigit() or not 1 <= int(count) <= MAX_BULK_COUNT:
+            errors.append(f"Count for {parts[0]} must be between 1 and {MAX_BULK_COUNT}.")
+        else:
+            counts[(char_name, crit_type)] = counts.get((char_name, crit_type), 0) + int(count)
+    return counts, errors
+
 
 def build_crit_embed(
         title, crit_type, char_name, num_crits, color, cow_msg
@@ -50,27 +94,45 @@ def build_crit_embed(
     return embed
 
 
+def set_cow_message(embed: discord.Embed, cow_msg) -> discord.Embed:
+    """
+    Replaces the message from Tim the cow in an embed built by build_crit_embed,
+    keeping the crit count line above it.
+
+    :param embed: The embed to update.
+    :param cow_msg: New message from Tim the cow.
+    :return: The updated embed.
+    """
+    count_line = embed.description.partition("\n")[0]
+    embed.description = f"{count_line}\n{cow_msg}"
+    return embed
+
+
 class CritCog(commands.Cog):
-    def __init__(self, bot, sheet_handler, tim_chat, pwsh_path, config) -> None:
+    def __init__(self, bot, sheet_handler, snapshot, stats, tim, config) -> None:
         self.bot = bot
         self.sheet_handler = sheet_handler
-        self.tim_chat = tim_chat
-        self.pwsh_path = pwsh_path
-        self.campaigns: list[str] = config["campaigns"]
-        self.characters: dict[str, dict] = config["characters"]
-        self.crit_types: dict[str, dict] = config["crit_types"]
+        self.snapshot = snapshot
+        self.crit_stats = stats
+        self.tim = tim
+        # Commands read this once and use their copy throughout, so a reload never mixes configs
+        self.config: Config = config
+
+    async def apply_config(self, config: Config) -> None:
+        """Swaps in a reloaded config, used by commands from then on."""
+        self.config = config
 
     async def campaign_autocomplete(self: commands.Cog, inter: discord.Interaction, current: str):
         return [
             app_commands.Choice(name=c.title(), value=c)
-            for c in self.campaigns
+            for c in self.config.campaigns
             if current.lower() in c.lower()
         ][:25]
 
     async def character_autocomplete(self: commands.Cog, inter: discord.Interaction, current: str):
         return [
             app_commands.Choice(name=c.title(), value=c)
-            for c in self.characters.keys()
+            for c in self.config.characters.keys()
             if current.lower() in c.lower()
         ][:25]
 
@@ -84,7 +146,8 @@ class CritCog(commands.Cog):
         """
         Increments the session number for a given campaign by one.
         """
-        await inter.response.defer()
+        with metrics.timer("defer"):
+            await inter.response.defer()
 
         logging.info(
             "Received 'session' command from user '%s' with campaign='%s'.",
@@ -92,20 +155,129 @@ class CritCog(commands.Cog):
             campaign,
         )
 
-        if campaign.upper() not in self.campaigns:
+        campaign_info = self.config.campaigns.get(campaign.upper())
+        if not campaign_info:
             await send_error_embed(
                 inter,
                 f"Received invalid campaign {campaign}. Please try again.",
             )
             return
 
-        new_session_number = self.sheet_handler.increment_cell("H2", campaign.title())
+        new_session_number = await self.sheet_handler.increment_cell(campaign_info.session_cell, campaign_info.sheet)
         msg = f"Campaign {campaign.title()} incremented to {new_session_number}."
+        with metrics.timer("discord_send"):
+            await inter.edit_original_response(
+                embed=discord.Embed(title=msg, color=0xA2C4C9)
+            )
+        logging.info(msg)
+
+    @app_commands.command(name="refresh", description="Reloads crit counts from the spreadsheet.")
+    async def refresh(self, inter: discord.Interaction):
+        """
+        Reloads every tracked crit count and session number from the spreadsheet,
+        picking up any edits made to it by hand.
+        """
+        with metrics.timer("defer"):
+            await inter.response.defer()
+
+        logging.info("Received 'refresh' command from user '%s'.", inter.user.display_name)
+
+        try:
+            loaded = await self.snapshot.refresh(priority=INTERACTIVE)
+        except HttpError as e:
+            logging.error("Failed to refresh snapshot for user '%s': %s", inter.user.display_name, e)
+            await send_error_embed(inter, "Could not reach the spreadsheet. Please try again.")
+            return
+
+        msg = f"Reloaded {loaded} cells from the spreadsheet."
         await inter.edit_original_response(
             embed=discord.Embed(title=msg, color=0xA2C4C9)
         )
         logging.info(msg)
 
+    @app_commands.command(name="stats", description="Shows a character's crit counts.")
+    @app_commands.autocomplete(char_name=character_autocomplete)
+    async def stats(
+            self,
+            inter: discord.Interaction,
+            char_name: str
+    ):
+        """
+        Shows how many crits of each type a character has, their place in their campaign
+        and their share of the campaign's crits. Served from memory, so it needs no defer.
+
+        :param inter: The interaction object generated by command invocation.
+        :param char_name: The name of the character to show stats for.
+        """
+        logging.info(
+            "Received 'stats' command from user '%s' with char_name='%s'.",
+            inter.user.display_name,
+            char_name,
+        )
+
+        char_info = self.config.characters.get(char_name.upper())
+        if not char_info:
+            await send_error_embed(inter, f"Received invalid character '{char_name}'. Please try again.")
+            return
+
+        name = char_info.name
+        counts = self.crit_stats.character(name)
+        lines = []
+        for crit_type in char_info.cells:
+            count = counts.get(crit_type, 0)
+            total = self.crit_stats.total(char_info.sheet, crit_type)
+            share = f", {count * 100 / total:.0f}% of the campaign's" if total else ""
+            lines.append(
+                f"**Nat {crit_type}s:** {count} (#{self.crit_stats.rank(name, crit_type)} in {char_info.sheet}{share})"
+            )
+
+        embed = discord.Embed(title=f"{char_name.title()}'s crits", color=char_info.color)
+        embed.description = "\n".join(lines)
+        with metrics.timer("discord_send"):
+            await inter.response.send_message(embed=embed)
+
+    @app_commands.command(name="leaderboard", description="Shows who has the most crits in a campaign.")
+    @app_commands.autocomplete(campaign=campaign_autocomplete)
+    async def leaderboard(
+            self,
+            inter: discord.Interaction,
+            campaign: str,
+            crit_type: Literal["1", "20"],
+    ):
+        """
+        Shows the characters with the most crits of a type in a campaign.
+
+        :param inter: The interaction object generated by command invocation.
+        :param campaign: The campaign to rank characters in.
+        :param crit_type: The type of crit to rank by, either "1" or "20".
+        """
+        logging.info(
+            "Received 'leaderboard' command from user '%s' with campaign='%s' and crit_type='%s'.",
+            inter.user.display_name,
+            campaign,
+            crit_type,
+        )
+
+        config = self.config
+        campaign_info = config.campaigns.get(campaign.upper())
+        if not campaign_info:
+            await send_error_embed(inter, f"Received invalid campaign {campaign}. Please try again.")
+            return
+        if crit_type not in config.crit_types:
+            await send_error_embed(inter, f"Received invalid crit type '{crit_type}'. Please try again.")
+            return
+
+        board = self.crit_stats.leaderboard(campaign_info.sheet, crit_type)
+        embed = discord.Embed(
+            title=f"Nat {crit_type} leaderboard for {campaign.title()}",
+            color=0xA2C4C9,
+        )
+        embed.description = "\n".join(
+            f"{place}. {name.title()}: {count}" for place, (name, count) in enumerate(board, start=1)
+        ) or "No crits yet."
+        with metrics.timer("discord_send"):
+            await inter.response.send_message(embed=embed)
+
     @app_commands.command(name="add", description="Adds a crit to the spreadsheet.")
     @app_commands.autocomplete(char_name=character_autocomplete)
     async def add(
@@ -123,7 +295,8 @@ class CritCog(commands.Cog):
         :param crit_type: The type of crit to add, either "1" or "20".
         :param char_name: The name of the character to add the crit to.
         """
-        await inter.response.defer()
+        with metrics.timer("defer"):
+            await inter.response.defer()
 
         logging.info(
             "Received 'add' command from user '%s' with crit_type='%s' and char_name='%s'.",
@@ -132,7 +305,8 @@ class CritCog(commands.Cog):
             char_name,
         )
 
-        char_info = self.characters.get(char_name.upper())
+        config = self.config
+        char_info = config.characters.get(char_name.upper())
         if not char_info:
             logging.warning(
                 "Invalid character name '%s' provided by user '%s'.",
@@ -145,7 +319,7 @@ class CritCog(commands.Cog):
             )
             return
 
-        crit_info = self.crit_types.get(crit_type)
+        crit_info = config.crit_types.get(crit_type)
         if not crit_info:
             logging.warning(
                 "Invalid crit type '%s' provided by user '%s'.",
@@ -158,14 +332,15 @@ class CritCog(commands.Cog):
             )
             return
 
-        cell = crit_info["col"] + char_info["row"]
+        cell = char_info.cells[crit_type]
         logging.info(
             "Updating crit count for character '%s' in cell '%s' on sheet '%s'.",
             char_name,
             cell,
-            char_info["sheet"],
+            char_info.sheet,
         )
-        num_crits = self.sheet_handler.increment_cell(cell, char_info["sheet"])
+        num_crits = await self.sheet_handler.increment_cell(cell, char_info.sheet)
+        metrics.inc("crits_added")
 
         logging.info(
             "Crit count for '%s' updated successfully. New count: %s.",
@@ -173,24 +348,101 @@ class CritCog(commands.Cog):
             num_crits,
         )
 
-        tim_response = talk_to_tim(
+        # Tim can take seconds, so the count goes out first and his line is edited in after
+        tim_task = asyncio.create_task(self.tim.talk_crit(
             f"{char_name.title()} rolled a Nat {crit_type}! They now have {num_crits}!",
             get_msg_author_name(inter),
-            self.tim_chat,
-        )
-
-        eyes = "$$" if crit_type == "20" else "XX"
-        cow_msg = cow_format(tim_response, self.pwsh_path, eyes)
+            get_chat_key(inter),
+        ))
 
         embed = build_crit_embed(
             "Nat {crit_type} added! {emoji}",
             crit_type,
             char_name,
             num_crits,
-            char_info["color"],
-            f"```{cow_msg}```",
+            char_info.color,
+            "*Tim is thinking...*",
         )
-        await inter.followup.send(file=discord.File(crit_info["img"]), embed=embed)
+        # The sound may need decoding first, so it starts alongside the reply rather than before it
+        sound_task = None
+        if voice := self.bot.get_cog("VoiceCog"):
+            sound_task = asyncio.create_task(voice.play_sound(inter, crit_info.sound))
+        with metrics.timer("discord_send"):
+            message = await inter.followup.send(file=discord.File(crit_info.img), embed=embed, wait=True)
         logging.info("Response sent to user '%s' for 'add' command.", inter.user.display_name)
+        if sound_task:
+            await sound_task
+
+        tim_response = await tim_task
+        eyes = "$$" if crit_type == "20" else "XX"
+        cow_msg = cow_format(tim_response, eyes)
+        with metrics.timer("discord_send"):
+            await message.edit(embed=set_cow_message(embed, f"```{cow_msg}```"))
+        logging.info("Tim's response added for user '%s' for 'add' command.", inter.user.display_name)
+
+    @app_commands.command(name="bulkadd", description="Adds several crits to the spreadsheet at once.")
+    @app_commands.describe(entries='Character, crit type and count per entry, e.g. "zohar 20 x3, morbo 1"')
+    async def bulkadd(
+            self,
+            inter: discord.Interaction,
+            entries: str
+    ):
+        """
+        Adds several crits to the spreadsheet at once, e.g. to back-fill a session, with a single
+        batch write, then responds with one summary embed and one message from Tim the cow.
+
+        :param inter: The interaction object generated by command invocation.
+        :param entries: The crits to add, as parsed by parse_bulk_entries.
+        """
+        with metrics.timer("defer"):
+            await inter.response.defer()
+
+        logging.info(
+            "Received 'bulkadd' command from user '%s' with entries='%s'.",
+            inter.user.display_name,
+            entries,
+        )
+
+        config = self.config
+        counts, errors = parse_bulk_entries(entries, config.characters, config.crit_types)
+        if errors or not counts:
+            logging.warning("Invalid bulk entries provided by user '%s': %s", inter.user.display_name, errors)
+            await send_error_embed(inter, "\n".join(errors) or "Received no entries. Please try again.")
+            return
+
+        cells = {
+            (char_name, crit_type): (config.characters[char_name].sheet, config.characters[char_name].cells[crit_type])
+            for char_name, crit_type in counts
+        }
+        try:
+            new_values = await self.sheet_handler.increment_cells(
+                {cells[entry]: count for entry, count in counts.items()}
+            )
+        except (HttpError, ValueError) as e:
+            logging.error("Failed to bulk add crits for user '%s': %s", inter.user.display_name, e)
+            await send_error_embed(inter, "Could not update the spreadsheet. Please try again.")
+            return
+        metrics.inc("crits_added", sum(counts.values()))
+
+        lines = [
+            f"{char_name.title()}: +{count} Nat {crit_type} (now {new_values[cells[(char_name, crit_type)]]})"
+            for (char_name, crit_type), count in counts.items()
+        ]
+        logging.info("Bulk added %d crits: %s", sum(counts.values()), "; ".join(lines))
+
+        # As in add, the counts go out first and Tim's line is edited in after
+        tim_task = asyncio.create_task(self.tim.talk_crit(
+            "Crits from earlier were just recorded: " + "; ".join(lines),
+            get_msg_author_name(inter),
+            get_chat_key(inter),
+        ))
+        embed = discord.Embed(title=f"Added {sum(counts.values())} crits!", color=0xA2C4C9)
+        embed.description = "\n".join(lines) + "\n*Tim is thinking...*"
+        with metrics.timer("discord_send"):
+            message = await inter.followup.send(embed=embed, wait=True)
 
-        play_sound(inter, crit_info["sound"])
+        cow_msg = cow_format(await tim_task)
+        embed.description = "\n".join(lines) + f"\n```{cow_msg}```"
+        with metrics.timer("discord_send"):
+            await message.edit(embed=embed)
+        logging.info("Response sent to user '%s' for 'bulkadd' command.", inter.user.display_name)
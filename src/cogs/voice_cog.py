@@ -2,6 +2,7 @@
 Handles voice-related commands, such as joining/leaving voice channels and enabling/disabling sounds.
 """
 import asyncio
+import subprocess
 from typing import Literal
 
 import discord
@@ -9,19 +10,82 @@ from discord import app_commands
 from discord.ext import commands
 import logging
 
+from config import Config, CritType
+from utils.audio import MixerSource, SoundCache
 from utils.helpers import send_error_embed
+from utils.metrics import metrics
 
 
 class VoiceCog(commands.Cog):
     """Cog that handles voice-related functionality for the Discord bot.
 
     This cog manages voice channel operations including joining/leaving channels
-    and controlling sound effects playback.
+    and controlling sound effects playback. Crit sounds are decoded once into a
+    SoundCache, which is refreshed whenever the config is reloaded, and played
+    through a per-guild MixerSource so that overlapping crits all get heard.
     """
 
-    def __init__(self, bot) -> None:
-        """Initialize the VoiceCog with a bot instance."""
+    def __init__(self, bot, config: Config) -> None:
+        """Initialize the VoiceCog with a bot instance and the crit sounds from the config."""
         self.bot = bot
+        self.crit_types: dict[str, CritType] = config.crit_types
+        self.audio_config: dict = config["audio"]
+        self.sound_cache = SoundCache(self.audio_config["cache_mb"] * 1_000_000)
+        self.mixers: dict[int, MixerSource] = {}
+
+    async def cog_load(self) -> None:
+        await self.sound_cache.sync([c.sound for c in self.crit_types.values()])
+
+    async def apply_config(self, config: Config) -> None:
+        """Decodes the crit sounds of a reloaded config and drops the ones no longer used."""
+        await self.sound_cache.sync([c.sound for c in config.crit_types.values()])
+        self.crit_types = config.crit_types
+        logging.info("Crit sounds reloaded.")
+
+    async def play_sound(self, inter: discord.Interaction, sound):
+        """
+        Plays a sound in the given context's voice channel. Sounds that cannot be loaded are
+        logged and skipped, so a broken sound never fails the command that played it.
+
+        :param inter: The interaction which asked to play the sound.
+        :param sound: The path to the sound file to play.
+        """
+        if inter.guild and inter.guild.voice_client:
+            mixer = self.mixers.get(inter.guild.id)
+            if not mixer:
+                mixer = MixerSource(self.audio_config["mode"], self.audio_config["max_streams"])
+                self.mixers[inter.guild.id] = mixer
+
+            with metrics.timer("sound_start"):
+                try:
+                    source = await self.sound_cache.source(sound)
+                except (OSError, subprocess.CalledProcessError) as e:
+                    logging.error("Failed to load sound '%s': %s", sound, e)
+                    return
+                added = mixer.add(source)
+                if added:
+                    self._start_mixer(inter.guild)
+            if not added:
+                metrics.inc("sounds_dropped")
+                logging.warning("Sound '%s' dropped, %d sounds already playing.", sound, mixer.max_streams)
+                return
+            logging.info("Sound '%s' played in channel '%s'.", sound, inter.guild.voice_client.channel)
+
+    def _start_mixer(self, guild: discord.Guild) -> None:
+        """Starts playing the guild's mixer, unless it is already playing or has nothing to play."""
+        voice_client = guild.voice_client
+        mixer = self.mixers.get(guild.id)
+        if not voice_client or not mixer or not mixer.active or voice_client.is_playing():
+            return
+
+        def after(error):
+            if error:
+                logging.error("Voice player in guild '%s' stopped with an error: %s", guild, error)
+            # A sound may have been added just as the player ran out of audio
+            if mixer.active:
+                self.bot.loop.call_soon_threadsafe(self._start_mixer, guild)
+
+        voice_client.play(mixer, after=after)
 
     @staticmethod
     async def join(inter: discord.Interaction) -> bool:
@@ -47,8 +111,7 @@ class VoiceCog(commands.Cog):
             logging.warning("Bot failed to join voice channel '%s': %s", channel, e)
             return False
 
-    @staticmethod
-    async def leave(inter) -> bool:
+    async def leave(self, inter) -> bool:
         """Leave the current voice channel."""
         if not inter.guild.voice_client:
             logging.warning(
@@ -59,6 +122,7 @@ class VoiceCog(commands.Cog):
             return False
 
         await inter.guild.voice_client.disconnect(force=True)
+        self.mixers.pop(inter.guild.id, None)
         logging.info(
             "Successfully left voice channel for user '%s'.",
             inter.user.display_name,
@@ -0,0 +1,217 @@
+"""
+Contains the Config class, the bot's configuration compiled from config.json into validated,
+slotted objects with every crit cell address worked out up front, and the ConfigWatcher class,
+which reloads the file when it changes and swaps the new config into the running bot.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import re
+from typing import Awaitable, Callable
+
+REQUIRED_SECTIONS = ("campaigns", "characters", "crit_types", "sheets", "audio", "tim_config", "metrics", "watchdog")
+SESSION_CELL = "H2"
+WATCH_INTERVAL = 30
+
+_COLUMN = re.compile(r"[A-Z]+")
+
+
+class ConfigError(ValueError):
+    """Raised when the config file is missing a setting or has an invalid one."""
+
+
+class CritType:
+    __slots__ = ("name", "col", "img", "sound")
+
+    def __init__(self, name: str, col: str, img: str, sound: str) -> None:
+        self.name = name
+        self.col = col
+        self.img = img
+        self.sound = sound
+
+
+class Character:
+    """A character whose crits are tracked, with the A1 address of its cell for each crit type."""
+
+    __slots__ = ("name", "color", "sheet", "row", "cells")
+
+    def __init__(self, name: str, color: int, sheet: str, row: str, crit_types: dict[str, CritType]) -> None:
+        self.name = name
+        self.color = color
+        self.sheet = sheet
+        self.row = row
+        self.cells: dict[str, str] = {crit_type: crit.col + row for crit_type, crit in crit_types.items()}
+
+
+class Campaign:
+    __slots__ = ("name", "sheet", "session_cell")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.sheet = name.title()
+        self.session_cell = SESSION_CELL
+
+
+class Config:
+    """
+    Compiled configuration. Campaigns and characters are keyed by upper case name and crit
+    types by name. Other sections are used once at startup, so they are still read from the
+    raw dict, by indexing the Config like one.
+    """
+
+    __slots__ = ("raw", "campaigns", "characters", "crit_types")
+
+    def __init__(self, raw: dict) -> None:
+        self.raw = raw
+        self.crit_types: dict[str, CritType] = {}
+        self.campaigns: dict[str, Campaign] = {}
+        self.characters: dict[str, Character] = {}
+
+    def __getitem__(self, section: str):
+        return self.raw[section]
+
+
+def _require(condition: bool, message: str) -> None:
+    if not condition:
+        raise ConfigError(message)
+
+
+def compile_config(raw: dict) -> Config:
+    """
+    Validates a config dict loaded from config.json and compiles it.
+
+    :param raw: The parsed JSON.
+    :raises ConfigError: If a section or setting is missing or invalid.
+    """
+    _require(isinstance(raw, dict), "The config must be a JSON object")
+    for section in REQUIRED_SECTIONS:
+        _require(section in raw, f"Missing section '{section}'")
+        expected, kind = (list, "array") if section == "campaigns" else (dict, "object")
+        _require(isinstance(raw[section], expected), f"Section '{section}' must be a JSON {kind}")
+    config = Config(raw)
+
+    for name, info in raw["crit_types"].items():
+        _require(isinstance(info, dict), f"Crit type '{name}' must be a JSON object")
+        _require(_COLUMN.fullmatch(str(info.get("col", ""))) is not None, f"Crit type '{name}' needs a column like 'B'")
+        for key in ("img", "sound"):
+            _require(os.path.isfile(str(info.get(key, ""))), f"Crit type '{name}' needs an existing '{key}' file")
+        config.crit_types[name] = CritType(name, info["col"], info["img"], info["sound"])
+
+    for name in raw["campaigns"]:
+        _require(isinstance(name, str) and name.isupper(), f"Campaign '{name}' must be an upper case name")
+        config.campaigns[name] = Campaign(name)
+
+    for name, info in raw["characters"].items():
+        _require(name.isupper(), f"Character '{name}' must be an upper case name")
+        _require(isinstance(info, dict), f"Character '{name}' must be a JSON object")
+        _require(isinstance(info.get("color"), int), f"Character '{name}' needs an integer 'color'")
+        row = info.get("row")
+        _require(isinstance(row, str) and row.isdigit(), f"Character '{name}' needs a numeric 'row' string, e.g. \"2\"")
+        _require(
+            str(info.get("sheet", "")).upper() in config.campaigns,
+            f"Character '{name}' is on sheet '{info.get('sheet')}', which is not a campaign",
+        )
+        # The campaign's sheet name, so differently cased spellings still name the same sheet
+        sheet = config.campaigns[str(info["sheet"]).upper()].sheet
+        config.characters[name] = Character(name, info["color"], sheet, info["row"], config.crit_types)
+
+    cells = [(char.sheet, cell) for char in config.characters.values() for cell in char.cells.values()]
+    _require(len(cells) == len(set(cells)), "Two characters share a crit cell")
+    return config
+
+
+def load_config(config_file: str) -> Config:
+    """
+    Loads the configuration from a JSON file and compiles it, logging the number of characters
+    and crit types loaded.
+
+    :param config_file: Path to the JSON configuration file
+    :return: The compiled configuration
+    """
+    try:
+        with open(config_file, encoding="UTF-8") as f:
+            config = compile_config(json.load(f))
+        logging.info("Config for %d characters loaded.", len(config.characters))
+        logging.info("Config for %d crit types loaded.", len(config.crit_types))
+        return config
+    except FileNotFoundError as e:
+        logging.error("Config file not found: %s", config_file)
+        raise e
+    except json.JSONDecodeError as e:
+        logging.error("Failed to parse JSON in config file: %s", config_file)
+        raise e
+    except ConfigError as e:
+        logging.error("Invalid config in %s: %s", config_file, e)
+        raise e
+    except Exception as e:
+        logging.error("Unexpected error while loading config: %s", e)
+        raise e
+
+
+class ConfigWatcher:
+    """
+    Checks the config file's modification time every interval seconds and, when it changes,
+    loads and compiles it again. If it is valid, it replaces config and each listener is
+    awaited with it in the order they were added; if not, the running config is kept.
+
+    Only campaigns, characters and crit types (including their sounds) take effect without
+    a restart; the other sections are read once at startup.
+    """
+
+    def __init__(self, config_file: str, config: Config, interval: float = WATCH_INTERVAL) -> None:
+        self.config_file = config_file
+        self.config = config
+        self.interval = interval
+        self.listeners: list[Callable[[Config], Awaitable[None]]] = []
+        self._mtime = os.path.getmtime(config_file)
+        self._task: asyncio.Task | None = None
+
+    async def reload(self) -> bool:
+        """
+        Loads the config file and hands it to the listeners.
+
+        :return: Whether the file was valid and applied.
+        """
+        try:
+            config = await asyncio.to_thread(load_config, self.config_file)
+        except (OSError, ValueError) as e:
+            logging.error("Keeping the running config, %s could not be loaded: %s", self.config_file, e)
+            return False
+
+        self.config = config
+        for listener in self.listeners:
+            try:
+                await listener(config)
+            except Exception as e:
+                logging.error("Failed to apply the reloaded config to %s: %s", listener, e)
+        logging.info("Config reloaded from %s.", self.config_file)
+        return True
+
+    async def _watch(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                mtime = os.path.getmtime(self.config_file)
+            except OSError as e:
+                logging.error("Cannot check %s for changes: %s", self.config_file, e)
+                continue
+            if mtime != self._mtime:
+                self._mtime = mtime
+                try:
+                    await self.reload()
+                except Exception as e:
+                    # Keep watching, so fixing the file still takes effect without a restart
+                    logging.error("Failed to reload %s: %s", self.config_file, e)
+
+    def start(self) -> None:
+        """Starts watching the config file for changes."""
+        self._task = asyncio.create_task(self._watch())
+        logging.info("Watching %s for changes every %s seconds.", self.config_file, self.interval)
+
+    def close(self) -> None:
+        """Stops watching the config file."""
+        if self._task:
+            self._task.cancel()
+            self._task = None
@@ -0,0 +1,212 @@
+"""
+Contains the WriteBehindCounter class, which answers increments of crit counts and session numbers
+from the in-memory sheet snapshot and writes dirty cells back to Google Sheets in batches.
+"""
+
+import asyncio
+import logging
+import sqlite3
+
+from googleapiclient.errors import HttpError
+
+from journal import CritJournal
+from scheduler import BACKGROUND
+from sheets import AsyncSheetsHandler, parse_count
+from snapshot import SheetSnapshot
+
+
+class WriteBehindCounter:
+    """
+    Authoritative in-memory counter store keyed by (subsheet, cell).
+
+    Values live in the shared SheetSnapshot. Increments are applied there and the cell is marked
+    dirty; dirty cells are written to the spreadsheet in a single values.batchUpdate every
+    flush_interval seconds and on close. Snapshot refreshes pick up manual edits to the sheet,
+    except for cells that are dirty at the time.
+
+    With a CritJournal, every increment is also committed to it before the caller gets the new
+    value, and journaled events are marked synced after each successful flush. replay() applies
+    events that were never synced, e.g. because the bot crashed or Sheets was down.
+    """
+
+    def __init__(
+        self,
+        sheets: AsyncSheetsHandler,
+        snapshot: SheetSnapshot,
+        flush_interval: float = 10,
+        journal: CritJournal | None = None,
+    ) -> None:
+        self.sheets = sheets
+        self.snapshot = snapshot
+        self.journal = journal
+        self.sheet_id = sheets.sheet_id
+        self.flush_interval = flush_interval
+        self._flush_task: asyncio.Task | None = None
+
+    async def _load(self, key: tuple[str, str]) -> None:
+        subsheet_id, cell = key
+        result = await self.sheets.get_values(self.sheet_id, subsheet_id, cell)
+        if isinstance(result, HttpError):
+            logging.error(
+                "Cannot increment cell '%s' on sheet '%s' due to error retrieving current value.",
+                cell,
+                subsheet_id,
+            )
+            raise result
+        # Another increment may have loaded the cell while this read was in flight
+        if key not in self.snapshot.values:
+            self.snapshot.set(subsheet_id, cell, parse_count(result, cell, subsheet_id))
+
+    async def increment_cell(self, cell, subsheet_id, amount: int = 1) -> int:
+        """Increments the value of the given cell on the given subsheet by amount (1 by default)."""
+        key = (subsheet_id, cell)
+        if key not in self.snapshot.values:
+            await self._load(key)
+
+        new_value = self.snapshot.values[key] + amount
+        self.snapshot.set(subsheet_id, cell, new_value, dirty=True)
+        await self._journal(subsheet_id, cell, amount, new_value)
+        return new_value
+
+    async def _load_many(self, keys: list[tuple[str, str]]) -> None:
+        """Loads every key missing from the snapshot with one values.batchGet, or none of them."""
+        missing = [key for key in keys if key not in self.snapshot.values]
+        if not missing:
+            return
+        result = await self.sheets.batch_get_values(
+            self.sheet_id, [f"{subsheet_id}!{cell}" for subsheet_id, cell in missing]
+        )
+        if isinstance(result, HttpError):
+            logging.error("Cannot increment %d cells due to error retrieving current values.", len(missing))
+            raise result
+        value_ranges = result.get("valueRanges", [])
+        if len(value_ranges) != len(missing):
+            raise ValueError(f"Expected {len(missing)} value ranges, got {len(value_ranges)}")
+        # Every value is parsed before any is stored, so an invalid cell leaves the snapshot untouched
+        values = {key: parse_count(value_range, key[1], key[0]) for key, value_range in zip(missing, value_ranges)}
+        for (subsheet_id, cell), value in values.items():
+            if (subsheet_id, cell) not in self.snapshot.values:
+                self.snapshot.set(subsheet_id, cell, value)
+
+    async def increment_cells(self, amounts: dict[tuple[str, str], int]) -> dict[tuple[str, str], int]:
+        """
+        Adds to several cells at once, or to none of them if any cell cannot be read. They are
+        written with the next flush, in one batch.
+
+        :param amounts: How much to add to each (subsheet, cell).
+        :return: The new value of each (subsheet, cell).
+        """
+        await self._load_many(list(amounts))
+
+        new_values = {}
+        for (subsheet_id, cell), amount in amounts.items():
+            new_values[(subsheet_id, cell)] = self.snapshot.values[(subsheet_id, cell)] + amount
+            self.snapshot.set(subsheet_id, cell, new_values[(subsheet_id, cell)], dirty=True)
+        for (subsheet_id, cell), amount in amounts.items():
+            await self._journal(subsheet_id, cell, amount, new_values[(subsheet_id, cell)])
+        return new_values
+
+    async def _journal(self, subsheet_id, cell, amount: int, value: int) -> None:
+        if not self.journal:
+            return
+        try:
+            await self.journal.append(subsheet_id, cell, amount, value)
+        except sqlite3.Error as e:
+            # The increment still reaches the sheet with the next flush, it just cannot be replayed
+            logging.error("Failed to journal increment of cell '%s' on sheet '%s': %s", cell, subsheet_id, e)
+
+    async def replay(self) -> int:
+        """
+        Applies journaled increments that were never marked synced, on top of the current
+        (freshly loaded) snapshot. Events are matched against the sheet by value: a cell only
+        ever grows, so the sheet already holds every event whose value it has reached, and only
+        events with a higher value are applied again. Journal order is not relied on, since
+        concurrent increments of a cell may be committed in either order. Replayed cells are
+        flushed right away.
+
+        :return: The number of increments replayed.
+        """
+        if not self.journal:
+            return 0
+
+        replayed = 0
+        for key, events in (await self.journal.pending()).items():
+            subsheet_id, cell = key
+            if key not in self.snapshot.values:
+                await self._load(key)
+            current = self.snapshot.values[key]
+
+            missing = [(amount, value) for amount, value in events if value > current]
+            if missing:
+                self.snapshot.set(subsheet_id, cell, current + sum(amount for amount, _ in missing), dirty=True)
+                replayed += len(missing)
+                logging.info(
+                    "Replaying %d journaled increments of cell '%s' on sheet '%s'.", len(missing), cell, subsheet_id
+                )
+
+        await self.flush()
+        return replayed
+
+    async def flush(self) -> int:
+        """
+        Writes every dirty cell to the spreadsheet in one values.batchUpdate.
+        Cells that fail to write stay dirty and are retried on the next flush.
+
+        :return: The number of cells written.
+        """
+        async with self.snapshot.lock:
+            # Every journaled event was applied to the snapshot before it was journaled, so all
+            # events up to here are covered by the values written below (or by earlier flushes)
+            synced_up_to = self.journal.last_id if self.journal else 0
+            dirty = self.snapshot.dirty
+            if not dirty:
+                await self._mark_synced(synced_up_to)
+                return 0
+
+            keys = list(dirty)
+            dirty.clear()
+            data = {
+                f"{subsheet_id}!{cell}": [[self.snapshot.values[(subsheet_id, cell)]]]
+                for subsheet_id, cell in keys
+            }
+            try:
+                result = await self.sheets.batch_update_values(self.sheet_id, data, priority=BACKGROUND)
+            except Exception:
+                dirty.update(keys)
+                raise
+            if isinstance(result, HttpError):
+                dirty.update(keys)
+                return 0
+
+            logging.info("Flushed %d dirty cells to the spreadsheet.", len(keys))
+            await self._mark_synced(synced_up_to)
+            return len(keys)
+
+    async def _mark_synced(self, up_to: int) -> None:
+        if not self.journal:
+            return
+        try:
+            await self.journal.mark_synced(up_to)
+        except sqlite3.Error as e:
+            # Unsynced events whose values are already on the sheet are skipped by replay()
+            logging.error("Failed to mark journaled events as synced: %s", e)
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logging.error("Failed to flush crit counter: %s", e)
+
+    def start(self) -> None:
+        """Starts flushing dirty cells in the background every flush_interval seconds."""
+        self._flush_task = asyncio.create_task(self._flush_loop())
+        logging.info("Crit counter flushing every %s seconds.", self.flush_interval)
+
+    async def close(self) -> None:
+        """Stops background flushing and writes any remaining dirty cells."""
+        if self._flush_task:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
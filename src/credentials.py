@@ -0,0 +1,93 @@
+"""
+Contains the CredentialRefresher class, which refreshes the Google credentials in the background
+ahead of their expiry, so that no Sheets call made for a user has to wait on a token refresh.
+"""
+
+import asyncio
+import datetime
+import json
+import logging
+import os
+
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+
+from sheets import SheetsHandler
+
+RETRY_INTERVAL = 60
+
+
+class CredentialRefresher:
+    """
+    Refreshes credentials margin seconds before they expire, saves them to token_file and hands
+    them to the SheetsHandler.
+
+    The refresh is done on a copy, which replaces the handler's credentials only once it holds
+    the new token, so requests in flight never see credentials halfway through a refresh.
+    The margin should exceed google-auth's own refresh threshold (3m45s), or the client will
+    refresh lazily inside a Sheets call first.
+    """
+
+    def __init__(self, handler: SheetsHandler, token_file: str, margin: float = 300) -> None:
+        self.handler = handler
+        self.token_file = token_file
+        self.margin = margin
+        self._task: asyncio.Task | None = None
+
+    def _seconds_until_refresh(self) -> float:
+        expiry = self.handler.creds.expiry
+        # google-auth keeps expiry as a naive UTC datetime
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        return (expiry - now).total_seconds() - self.margin
+
+    def _refreshed(self) -> Credentials:
+        """Returns a refreshed copy of the handler's credentials. Blocks on the token endpoint."""
+        creds = self.handler.creds
+        fresh = Credentials.from_authorized_user_info(json.loads(creds.to_json()), creds.scopes)
+        fresh.refresh(Request())
+        return fresh
+
+    def _save(self, creds: Credentials) -> None:
+        """Writes the token file atomically, so a crash mid-write cannot corrupt it."""
+        tmp_file = f"{self.token_file}.tmp"
+        with open(tmp_file, "w", encoding="UTF-8") as f:
+            f.write(creds.to_json())
+        os.replace(tmp_file, self.token_file)
+
+    async def refresh(self) -> None:
+        """Refreshes the credentials now, saves them and swaps them into the handler."""
+        creds = await asyncio.to_thread(self._refreshed)
+        try:
+            await asyncio.to_thread(self._save, creds)
+        except OSError as e:
+            logging.error("Failed to save refreshed credentials to %s: %s", self.token_file, e)
+        self.handler.set_credentials(creds)
+        logging.info("Google credentials refreshed, valid until %s UTC.", creds.expiry)
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            if not self.handler.creds.expiry:
+                logging.info("Google credentials do not expire, so they will not be refreshed.")
+                return
+            await asyncio.sleep(max(0.0, self._seconds_until_refresh()))
+            try:
+                await self.refresh()
+            except Exception as e:
+                # Any failure is retried, since tokens would otherwise never be refreshed again
+                logging.error(
+                    "Failed to refresh Google credentials, retrying in %d seconds: %s", RETRY_INTERVAL, e
+                )
+                await asyncio.sleep(RETRY_INTERVAL)
+
+    def start(self) -> None:
+        """Starts refreshing the credentials in the background."""
+        self._task = asyncio.create_task(self._refresh_loop())
+        logging.info(
+            "Google credentials will be refreshed %d seconds before they expire.", self.margin
+        )
+
+    def close(self) -> None:
+        """Stops refreshing the credentials."""
+        if self._task:
+            self._task.cancel()
+            self._task = None
@@ -0,0 +1,107 @@
+"""
+Contains the CritJournal class, a local SQLite log of every crit and session increment. Events are
+committed to disk before the user is answered and deleted once their values are on the
+spreadsheet, so increments that never reached the sheet can be replayed after a crash or outage.
+"""
+
+import asyncio
+import sqlite3
+import threading
+import time
+
+from utils.metrics import metrics
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    subsheet TEXT NOT NULL,
+    cell TEXT NOT NULL,
+    amount INTEGER NOT NULL,
+    value INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+
+class CritJournal:
+    """
+    Event log in a SQLite database in WAL mode, synced on every commit.
+
+    Each event records the amount a cell was increased by and the value it was increased to.
+    Events are deleted once they are synced, so the table only holds the unsynced backlog.
+    Queries run in worker threads on one shared connection, which is guarded by a lock.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            # FULL syncs the WAL on every commit, so committed events survive power loss too
+            self._db.execute("PRAGMA synchronous=FULL")
+            self._db.executescript(SCHEMA)
+            self._migrate()
+            # AUTOINCREMENT never reuses ids, so the sequence holds the last id even once it is deleted
+            self.last_id = self._db.execute(
+                "SELECT COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'events'), 0)"
+            ).fetchone()[0]
+            self.synced_id = self._db.execute(
+                "SELECT COALESCE(MIN(id) - 1, ?) FROM events", (self.last_id,)
+            ).fetchone()[0]
+
+    def _migrate(self) -> None:
+        """Upgrades journals that flagged synced events instead of deleting them."""
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(events)")]
+        if "synced" not in columns:
+            return
+        with self._db:
+            self._db.execute("DELETE FROM events WHERE synced")
+            self._db.execute("DROP INDEX IF EXISTS events_pending")
+            self._db.execute("ALTER TABLE events DROP COLUMN synced")
+
+    def _append(self, subsheet_id, cell, amount: int, value: int) -> int:
+        with self._lock, self._db:
+            event_id = self._db.execute(
+                "INSERT INTO events (subsheet, cell, amount, value, created_at) VALUES (?, ?, ?, ?, ?)",
+                (subsheet_id, cell, amount, value, time.time()),
+            ).lastrowid
+            self.last_id = max(self.last_id, event_id)
+            return event_id
+
+    async def append(self, subsheet_id, cell, amount: int, value: int) -> int:
+        """
+        Records that a cell was increased by amount to value, returning once it is on disk.
+
+        :return: The id of the event.
+        """
+        with metrics.timer("journal_append"):
+            return await asyncio.to_thread(self._append, subsheet_id, cell, amount, value)
+
+    def _mark_synced(self, up_to: int) -> None:
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM events WHERE id <= ?", (up_to,))
+            self.synced_id = max(self.synced_id, up_to)
+
+    async def mark_synced(self, up_to: int) -> None:
+        """Marks every event up to and including id up_to as written to the sheet, deleting them."""
+        if up_to > self.synced_id:
+            await asyncio.to_thread(self._mark_synced, up_to)
+
+    def _pending(self) -> dict[tuple[str, str], list[tuple[int, int]]]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT subsheet, cell, amount, value FROM events ORDER BY id"
+            ).fetchall()
+        pending: dict[tuple[str, str], list[tuple[int, int]]] = {}
+        for subsheet_id, cell, amount, value in rows:
+            pending.setdefault((subsheet_id, cell), []).append((amount, value))
+        return pending
+
+    async def pending(self) -> dict[tuple[str, str], list[tuple[int, int]]]:
+        """Returns the (amount, value) of every event not yet synced, per (subsheet, cell), oldest first."""
+        return await asyncio.to_thread(self._pending)
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,196 @@
+"""
+Contains the SheetsScheduler class, which runs blocking Sheets calls in worker threads in priority
+order, within the API's per-minute read and write quotas, retrying calls that were rate limited
+or hit a server error, so that crits get queued under load instead of failing.
+"""
+
+import asyncio
+import itertools
+import logging
+import random
+import time
+
+from googleapiclient.errors import HttpError
+
+from utils.metrics import metrics
+
+# Lower runs first: commands users are waiting on, then snapshot refreshes and write-behind flushes
+INTERACTIVE = 0
+BACKGROUND = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 32.0
+
+
+class TokenBucket:
+    """
+    Rate limiter allowing rate_per_minute calls per minute on average, and bursts of up to
+    capacity calls. Only used from the event loop thread, so it needs no lock.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: float) -> None:
+        self.rate = rate_per_minute / 60
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def wait_time(self) -> float:
+        """Returns how many seconds until a token is available, 0 if one is available now."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        """Takes a token, which wait_time() must have just reported available."""
+        self.tokens -= 1
+
+
+def retryable(error: Exception) -> bool:
+    """Whether a failed Sheets call is worth retrying: rate limits and server errors."""
+    return isinstance(error, HttpError) and error.resp.status in RETRY_STATUSES
+
+
+class Job:
+    def __init__(self, func, args: tuple, quotas: tuple[str, ...], priority: int) -> None:
+        self.func = func
+        self.args = args
+        self.quotas = quotas
+        self.priority = priority
+        self.attempts = 0
+        self.throttled = False
+        self.queued_at = time.perf_counter()
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+
+class SheetsScheduler:
+    """
+    Priority queue of Sheets calls served by max_concurrency workers.
+
+    Each call takes a token from the read or write bucket (or both, for a read-then-write
+    increment) before it runs, so requests never outpace the per-minute quotas; the buckets
+    allow bursts of a sixth of a minute's quota. Workers only take a call off the queue once
+    its tokens are available, so throttled calls wait in the queue, where later calls of
+    higher priority still overtake them. Calls that return or raise an HttpError with
+    status 429 or 5xx are requeued after a jittered exponential backoff, up to max_retries
+    times, after which the error is handed to the caller as before.
+
+    Queue depth per priority is exported as a gauge, and the time each call spent queued as
+    the sheets_queue stage.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 4,
+        read_quota: float = 60,
+        write_quota: float = 60,
+        max_retries: int = 5,
+    ) -> None:
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.buckets = {
+            "read": TokenBucket(read_quota, max(1.0, read_quota / 6)),
+            "write": TokenBucket(write_quota, max(1.0, write_quota / 6)),
+        }
+        self._queue: asyncio.PriorityQueue | None = None
+        self._seq = itertools.count()
+        self._depth = dict.fromkeys(PRIORITY_NAMES, 0)
+        self._workers: list[asyncio.Task] = []
+        # Set whenever a call is queued, to wake workers waiting for tokens for a lower priority call
+        self._queued = asyncio.Event()
+
+    def _put(self, job: Job) -> None:
+        self._queue.put_nowait((job.priority, next(self._seq), job))
+        self._set_depth(job.priority, 1)
+        self._queued.set()
+
+    def _set_depth(self, priority: int, change: int) -> None:
+        self._depth[priority] += change
+        metrics.set(f"sheets_queue_{PRIORITY_NAMES[priority]}", self._depth[priority])
+
+    async def submit(self, func, *args, quotas: tuple[str, ...] = ("read",), priority: int = INTERACTIVE):
+        """
+        Queues a blocking Sheets call and returns its result once it has run.
+
+        :param func: The SheetsHandler method to call.
+        :param quotas: The quotas the call counts against, "read" and/or "write".
+        :param priority: INTERACTIVE or BACKGROUND.
+        """
+        if not self._workers:
+            self._queue = asyncio.PriorityQueue()
+            self._workers = [asyncio.create_task(self._work()) for _ in range(self.max_concurrency)]
+        job = Job(func, args, quotas, priority)
+        self._put(job)
+        return await job.future
+
+    async def _next_job(self) -> Job:
+        """Takes the first call in priority order off the queue once its tokens are available."""
+        while True:
+            _, seq, job = await self._queue.get()
+            self._set_depth(job.priority, -1)
+            if job.future.done():
+                continue
+
+            delay = max(self.buckets[quota].wait_time() for quota in job.quotas)
+            if not delay:
+                for quota in job.quotas:
+                    self.buckets[quota].take()
+                return job
+
+            if not job.throttled:
+                job.throttled = True
+                metrics.inc("sheets_throttled")
+            # Put it back in its place and wait for the tokens or for a newly queued call that
+            # may go first. Idle workers blocked in get() take it straight back and end up
+            # waiting here too, which costs a few wakeups but never a token. Requeuing does
+            # not set _queued, so they do not wake each other up again.
+            self._queue.put_nowait((job.priority, seq, job))
+            self._set_depth(job.priority, 1)
+            self._queued.clear()
+            try:
+                await asyncio.wait_for(self._queued.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _work(self) -> None:
+        while True:
+            job = await self._next_job()
+            metrics.observe("sheets_queue", time.perf_counter() - job.queued_at)
+
+            try:
+                result = await asyncio.to_thread(job.func, *job.args)
+                error = result if isinstance(result, HttpError) else None
+            except Exception as e:
+                result, error = None, e
+
+            if error and retryable(error) and job.attempts < self.max_retries:
+                job.attempts += 1
+                delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** job.attempts))
+                metrics.inc("sheets_retries")
+                logging.warning(
+                    "Sheets call %s failed with status %s, retry %d of %d in %.1f seconds.",
+                    job.func.__name__,
+                    error.resp.status,
+                    job.attempts,
+                    self.max_retries,
+                    delay,
+                )
+                asyncio.get_running_loop().call_later(delay, self._requeue, job)
+            elif job.future.done():
+                pass
+            elif error and result is None:
+                job.future.set_exception(error)
+            else:
+                job.future.set_result(result)
+
+    def _requeue(self, job: Job) -> None:
+        job.queued_at = time.perf_counter()
+        self._put(job)
+
+    def close(self) -> None:
+        """Stops the workers. Calls still queued are not run."""
+        for worker in self._workers:
+            worker.cancel()
+        self._workers = []
@@ -3,10 +3,22 @@ Contains the SheetsHandler class, which provides methods for interacting with Go
 This includes updating values, retrieving values, and incrementing cell values.
 The class uses Google Sheets API for these operations and includes error handling
 and logging for better traceability and debugging.
+
+The Sheets service is built once per handler, and requests are executed over a pool of
+authorized HTTP connections so that TLS sessions are reused between calls.
+AsyncSheetsHandler wraps a SheetsHandler for use from coroutines, running the blocking
+client in worker threads so that Sheets I/O never stalls the Discord event loop, and
+coalescing concurrent increments of the same cell so that none of them are lost.
 """
 
+import asyncio
 import logging
+import queue
+import threading
+from contextlib import contextmanager
 
+import httplib2
+from google_auth_httplib2 import AuthorizedHttp
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 from google.oauth2.credentials import Credentials
@@ -14,15 +26,131 @@ from google.auth.external_account_authorized_user import (
     Credentials as ExternalAccountCredentials,
 )
 
+from scheduler import INTERACTIVE, SheetsScheduler
+from utils.metrics import metrics
+
+
+def parse_count(value_range: dict, cell, subsheet_id) -> int:
+    """Returns the integer held in a single-cell value range, raising ValueError if there is none."""
+    value = value_range.get("values", [])
+    if not value or not value[0] or not value[0][0].isdigit():
+        logging.warning(
+            "Cell '%s' on sheet '%s' does not contain a valid integer value.",
+            cell,
+            subsheet_id,
+        )
+        raise ValueError(f"Invalid value in cell '{cell}' on sheet '{subsheet_id}'")
+    return int(value[0][0])
+
+
+class HttpPool:
+    """
+    Thread-safe pool of authorized HTTP connections.
+
+    httplib2.Http objects are not safe to share between threads, so each request borrows
+    a connection from the pool for its duration and returns it afterwards. Idle connections
+    keep their TLS session open, so reused connections skip the handshake. Hits, misses
+    and idle connections are exported as the sheets_pool_* metrics.
+    """
+
+    def __init__(
+        self, creds: Credentials | ExternalAccountCredentials, max_idle: int = 4, timeout: float = 30
+    ) -> None:
+        self.creds = creds
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self._idle: queue.LifoQueue[AuthorizedHttp] = queue.LifoQueue(maxsize=max_idle)
+        self._lock = threading.Lock()
+        self.closed = False
+        self.hits = 0
+        self.misses = 0
+
+    @contextmanager
+    def connection(self):
+        """Borrows a connection from the pool, creating a new one if none are idle."""
+        try:
+            http = self._idle.get_nowait()
+            with self._lock:
+                self.hits += 1
+            metrics.inc("sheets_pool_hits")
+            # Idle connections may predate a credential refresh; only the borrower touches them
+            if http.credentials is not self.creds:
+                http.credentials = self.creds
+        except queue.Empty:
+            http = AuthorizedHttp(self.creds, http=httplib2.Http(timeout=self.timeout))
+            with self._lock:
+                self.misses += 1
+            metrics.inc("sheets_pool_misses")
+            logging.debug("Opened new Sheets HTTP connection (%d total).", self.misses)
+
+        try:
+            yield http
+        finally:
+            try:
+                if self.closed:
+                    raise queue.Full
+                self._idle.put_nowait(http)
+            except queue.Full:
+                http.close()
+            metrics.set("sheets_pool_idle", self._idle.qsize())
+
+    def set_credentials(self, creds: Credentials | ExternalAccountCredentials) -> None:
+        """Authorizes requests with new credentials from now on, keeping the open connections."""
+        self.creds = creds
+
+    def close(self) -> None:
+        """Closes every idle connection. Connections in use are closed when they are returned."""
+        self.closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def stats(self) -> dict[str, int]:
+        """Returns the pool's hit/miss counters and the number of idle connections."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "idle": self._idle.qsize()}
+
 
 class SheetsHandler:
     def __init__(
-        self, sheet_id, creds: Credentials | ExternalAccountCredentials
+        self,
+        sheet_id,
+        creds: Credentials | ExternalAccountCredentials,
+        pool_size: int = 4,
+        api_endpoint: str | None = None,
     ) -> None:
         if not isinstance(creds, (Credentials, ExternalAccountCredentials)):
             raise TypeError(f"Expected Credentials object, got {type(creds)}")
         self.sheet_id = sheet_id
         self.creds = creds
+        # The discovery document ships with the client library, so this does no network I/O.
+        # api_endpoint points the client at another server, such as the benchmark's fake Sheets.
+        self.service = build(
+            "sheets",
+            "v4",
+            credentials=creds,
+            cache_discovery=False,
+            client_options={"api_endpoint": api_endpoint} if api_endpoint else None,
+        )
+        # Building a resource generates all of its methods and their docstrings, which costs
+        # tens of milliseconds, so the values resource is built once and shared
+        self.values = self.service.spreadsheets().values()
+        self.pool = HttpPool(creds, max_idle=pool_size)
+        logging.info("Sheets service built with a pool of up to %d connections.", pool_size)
+
+    def set_credentials(self, creds: Credentials | ExternalAccountCredentials) -> None:
+        """
+        Replaces the credentials used for new requests, e.g. after a refresh. Pooled connections
+        are kept open and switch to the new credentials the next time they are borrowed.
+        """
+        self.pool.set_credentials(creds)
+        self.creds = creds
+
+    def pool_stats(self) -> dict[str, int]:
+        """Returns hit/miss statistics for the HTTP connection pool."""
+        return self.pool.stats()
 
     def update_values(
         self,
@@ -34,18 +162,14 @@ class SheetsHandler:
         """Updates values on the spreadsheet in the given range with given values"""
         range_name = f"{subsheet_id}!{_range_name}"
         try:
-            service = build("sheets", "v4", credentials=self.creds)
-            result = (
-                service.spreadsheets()
-                .values()
-                .update(
-                    spreadsheetId=spreadsheet_id,
-                    range=range_name,
-                    valueInputOption="USER_ENTERED",
-                    body={"values": values},
-                )
-                .execute()
+            request = self.values.update(
+                spreadsheetId=spreadsheet_id,
+                range=range_name,
+                valueInputOption="USER_ENTERED",
+                body={"values": values},
             )
+            with self.pool.connection() as http, metrics.timer("sheets_write"):
+                result = request.execute(http=http)
             logging.info(
                 "Updated %s cells in range '%s' on sheet '%s'.",
                 result.get("updatedCells"),
@@ -54,6 +178,7 @@ class SheetsHandler:
             )
             return result
         except HttpError as error:
+            metrics.inc("sheets_errors")
             logging.error(
                 "Failed to update values in range '%s' on sheet '%s': %s",
                 range_name,
@@ -66,19 +191,15 @@ class SheetsHandler:
         """Returns values from the spreadsheet from the specified range"""
         range_name = f"{subsheet_id}!{range_name}"
         try:
-            service = build("sheets", "v4", credentials=self.creds)
             logging.info(
                 "Attempting to retrieve values from range '%s' on sheet '%s'...",
                 range_name,
                 subsheet_id,
             )
             # pylint: disable=maybe-no-member
-            result = (
-                service.spreadsheets()
-                .values()
-                .get(spreadsheetId=spreadsheet_id, range=range_name)
-                .execute()
-            )
+            request = self.values.get(spreadsheetId=spreadsheet_id, range=range_name)
+            with self.pool.connection() as http, metrics.timer("sheets_read"):
+                result = request.execute(http=http)
             rows = result.get("values", [])
             logging.info(
                 "Successfully retrieved %s rows from range '%s' on sheet '%s'.",
@@ -88,6 +209,7 @@ class SheetsHandler:
             )
             return result
         except HttpError as error:
+            metrics.inc("sheets_errors")
             logging.error(
                 "Failed to retrieve values from range '%s' on sheet '%s': %s",
                 range_name,
@@ -96,8 +218,47 @@ class SheetsHandler:
             )
             return error
 
-    def increment_cell(self, cell, subsheet_id) -> int:
-        """Increments the value of the given cell on the given subsheet by 1."""
+    def batch_update_values(self, spreadsheet_id, data: dict[str, list]):
+        """Updates several ranges in one request. data maps 'Subsheet!A1' ranges to values."""
+        try:
+            request = self.values.batchUpdate(
+                spreadsheetId=spreadsheet_id,
+                body={
+                    "valueInputOption": "USER_ENTERED",
+                    "data": [
+                        {"range": range_name, "values": values}
+                        for range_name, values in data.items()
+                    ],
+                },
+            )
+            with self.pool.connection() as http, metrics.timer("sheets_write"):
+                result = request.execute(http=http)
+            logging.info(
+                "Updated %s cells across %d ranges in one batch.",
+                result.get("totalUpdatedCells"),
+                len(data),
+            )
+            return result
+        except HttpError as error:
+            metrics.inc("sheets_errors")
+            logging.error("Failed to batch update %d ranges: %s", len(data), error)
+            return error
+
+    def batch_get_values(self, spreadsheet_id, ranges: list[str]):
+        """Returns values for several 'Subsheet!A1' ranges in one request, in request order."""
+        try:
+            request = self.values.batchGet(spreadsheetId=spreadsheet_id, ranges=ranges)
+            with self.pool.connection() as http, metrics.timer("sheets_read"):
+                result = request.execute(http=http)
+            logging.info("Retrieved %d ranges in one batch.", len(result.get("valueRanges", [])))
+            return result
+        except HttpError as error:
+            metrics.inc("sheets_errors")
+            logging.error("Failed to batch retrieve %d ranges: %s", len(ranges), error)
+            return error
+
+    def increment_cell(self, cell, subsheet_id, amount: int = 1) -> int:
+        """Increments the value of the given cell on the given subsheet by amount (1 by default)."""
         values = self.get_values(self.sheet_id, subsheet_id, cell)
         if isinstance(values, HttpError):
             logging.error(
@@ -107,16 +268,173 @@ class SheetsHandler:
             )
             raise values
 
-        value = values.get("values", [])
-        if not value or not value[0] or not value[0][0].isdigit():
-            logging.warning(
-                "Cell '%s' on sheet '%s' does not contain a valid integer value.",
-                cell,
-                subsheet_id,
+        new_value = parse_count(values, cell, subsheet_id) + amount
+        result = self.update_values(self.sheet_id, subsheet_id, cell, [[new_value]])
+        if isinstance(result, HttpError):
+            # Raised so the scheduler can retry rate limits, and the caller never reports a lost crit
+            raise result
+
+        return new_value
+
+class AsyncSheetsHandler:
+    """
+    Awaitable counterpart of SheetsHandler.
+
+    Each call runs the blocking Google client in a worker thread, through a SheetsScheduler
+    that keeps requests within the per-minute quotas, runs INTERACTIVE calls ahead of
+    BACKGROUND ones and retries rate limited calls. At most max_concurrency calls are in
+    flight at once, which should not exceed the handler's connection pool size.
+
+    Increments are serialized per cell: callers that arrive while a cell's read/write is in
+    flight are queued, and the whole queue is then applied with a single read and a single
+    write of +k. Increments of different cells never wait on each other. When a fresh
+    SheetSnapshot is attached, the read is answered from it and only the write goes out.
+    increment_cells adds to several cells with one batch read and one batch write.
+    """
+
+    def __init__(
+        self,
+        handler: SheetsHandler,
+        max_concurrency: int = 4,
+        read_quota: float = 60,
+        write_quota: float = 60,
+        max_retries: int = 5,
+    ) -> None:
+        self.handler = handler
+        self.sheet_id = handler.sheet_id
+        self.scheduler = SheetsScheduler(max_concurrency, read_quota, write_quota, max_retries)
+        self._pending: dict[tuple[str, str], list[asyncio.Future]] = {}
+        # Per cell, the drain task or bulk increment currently applying increments to it
+        self._drains: dict[tuple[str, str], asyncio.Future] = {}
+        # Optional snapshot.SheetSnapshot used to skip the read half of increments
+        self.snapshot = None
+
+    def close(self) -> None:
+        """Stops the scheduler's workers."""
+        self.scheduler.close()
+
+    async def update_values(self, spreadsheet_id, subsheet_id, range_name, values, priority=INTERACTIVE):
+        """Updates values on the spreadsheet in the given range with given values"""
+        return await self.scheduler.submit(
+            self.handler.update_values, spreadsheet_id, subsheet_id, range_name, values,
+            quotas=("write",), priority=priority,
+        )
+
+    async def get_values(self, spreadsheet_id, subsheet_id, range_name, priority=INTERACTIVE):
+        """Returns values from the spreadsheet from the specified range"""
+        return await self.scheduler.submit(
+            self.handler.get_values, spreadsheet_id, subsheet_id, range_name, priority=priority
+        )
+
+    async def batch_update_values(self, spreadsheet_id, data: dict[str, list], priority=INTERACTIVE):
+        """Updates several ranges in one request. data maps 'Subsheet!A1' ranges to values."""
+        return await self.scheduler.submit(
+            self.handler.batch_update_values, spreadsheet_id, data, quotas=("write",), priority=priority
+        )
+
+    async def batch_get_values(self, spreadsheet_id, ranges: list[str], priority=INTERACTIVE):
+        """Returns values for several 'Subsheet!A1' ranges in one request, in request order."""
+        return await self.scheduler.submit(
+            self.handler.batch_get_values, spreadsheet_id, ranges, priority=priority
+        )
+
+    async def increment_cell(self, cell, subsheet_id) -> int:
+        """Increments the value of the given cell on the given subsheet by 1."""
+        key = (subsheet_id, cell)
+        future = asyncio.get_running_loop().create_future()
+        self._pending.setdefault(key, []).append(future)
+        if key not in self._drains:
+            self._drains[key] = asyncio.create_task(self._drain(key))
+        return await future
+
+    async def _drain(self, key: tuple[str, str]) -> None:
+        """Applies queued increments of one cell in batches until none are left."""
+        subsheet_id, cell = key
+        try:
+            while waiters := self._pending.pop(key, None):
+                try:
+                    new_value = await self._add_to_cell(cell, subsheet_id, len(waiters))
+                except Exception as e:
+                    for waiter in waiters:
+                        if not waiter.done():
+                            waiter.set_exception(e)
+                    continue
+
+                if len(waiters) > 1:
+                    logging.info(
+                        "Coalesced %d increments of cell '%s' on sheet '%s'.",
+                        len(waiters),
+                        cell,
+                        subsheet_id,
+                    )
+                first_value = new_value - len(waiters) + 1
+                for offset, waiter in enumerate(waiters):
+                    if not waiter.done():
+                        waiter.set_result(first_value + offset)
+        finally:
+            del self._drains[key]
+
+    async def increment_cells(self, amounts: dict[tuple[str, str], int]) -> dict[tuple[str, str], int]:
+        """
+        Adds to several cells with a single values.batchGet (skipped if the snapshot is fresh)
+        and a single values.batchUpdate. Single-cell increments of the same cells wait until
+        the batch is written.
+
+        :param amounts: How much to add to each (subsheet, cell).
+        :return: The new value of each (subsheet, cell).
+        """
+        while busy := [self._drains[key] for key in amounts if key in self._drains]:
+            await asyncio.wait(busy)
+        done = asyncio.get_running_loop().create_future()
+        for key in amounts:
+            self._drains[key] = done
+
+        try:
+            current = {key: self.snapshot.get(*key) if self.snapshot else None for key in amounts}
+            missing = [key for key, value in current.items() if value is None]
+            if missing:
+                result = await self.batch_get_values(
+                    self.sheet_id, [f"{subsheet_id}!{cell}" for subsheet_id, cell in missing]
+                )
+                if isinstance(result, HttpError):
+                    raise result
+                value_ranges = result.get("valueRanges", [])
+                if len(value_ranges) != len(missing):
+                    raise ValueError(f"Expected {len(missing)} value ranges, got {len(value_ranges)}")
+                for key, value_range in zip(missing, value_ranges):
+                    current[key] = parse_count(value_range, key[1], key[0])
+
+            new_values = {key: current[key] + amount for key, amount in amounts.items()}
+            result = await self.batch_update_values(
+                self.sheet_id,
+                {f"{subsheet_id}!{cell}": [[value]] for (subsheet_id, cell), value in new_values.items()},
             )
-            raise ValueError(f"Invalid value in cell '{cell}' on sheet '{subsheet_id}'")
+            if isinstance(result, HttpError):
+                raise result
+            if self.snapshot:
+                for (subsheet_id, cell), value in new_values.items():
+                    self.snapshot.set(subsheet_id, cell, value)
+            return new_values
+        finally:
+            done.set_result(None)
+            for key in amounts:
+                del self._drains[key]
+                if key in self._pending:
+                    self._drains[key] = asyncio.create_task(self._drain(key))
 
-        new_value = int(value[0][0]) + 1
-        self.update_values(self.sheet_id, subsheet_id, cell, [[new_value]])
+    async def _add_to_cell(self, cell, subsheet_id, amount: int) -> int:
+        """Adds amount to a cell, reading its current value from the snapshot when possible."""
+        current = self.snapshot.get(subsheet_id, cell) if self.snapshot else None
+        if current is None:
+            new_value = await self.scheduler.submit(
+                self.handler.increment_cell, cell, subsheet_id, amount, quotas=("read", "write")
+            )
+        else:
+            new_value = current + amount
+            result = await self.update_values(self.sheet_id, subsheet_id, cell, [[new_value]])
+            if isinstance(result, HttpError):
+                raise result
 
+        if self.snapshot:
+            self.snapshot.set(subsheet_id, cell, new_value)
         return new_value
@@ -0,0 +1,198 @@
+"""
+Contains the SheetSnapshot class, an in-memory index of every crit count and session number
+configured for the bot, loaded from the spreadsheet with a single values.batchGet.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Callable
+
+from googleapiclient.errors import HttpError
+
+from config import Config
+from scheduler import BACKGROUND
+from sheets import AsyncSheetsHandler
+
+
+def column_index(col: str) -> int:
+    """Returns the zero-based index of an A1 column label, e.g. "A" -> 0, "AA" -> 26."""
+    index = 0
+    for char in col.upper():
+        index = index * 26 + ord(char) - ord("A") + 1
+    return index - 1
+
+
+def column_label(index: int) -> str:
+    """Returns the A1 column label of a zero-based column index, e.g. 0 -> "A", 26 -> "AA"."""
+    label = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        label = chr(ord("A") + remainder) + label
+    return label
+
+
+def tracked_cells(config: Config) -> list[tuple[str, str]]:
+    """
+    Returns every (subsheet, cell) pair the bot can increment: one cell per character and
+    crit type, plus the session number cell of each campaign.
+
+    :param config: Configuration for the bot
+    """
+    cells = [(campaign.sheet, campaign.session_cell) for campaign in config.campaigns.values()]
+    for char_info in config.characters.values():
+        cells.extend((char_info.sheet, cell) for cell in char_info.cells.values())
+    return cells
+
+
+def snapshot_ranges(config: Config) -> list[tuple[str, int, int]]:
+    """
+    Returns the ranges covering every tracked cell, as (range, first column, first row).
+    Each subsheet gets one rectangle spanning its characters' rows and the crit columns,
+    plus the session number cell of each campaign.
+
+    :param config: Configuration for the bot
+    """
+    ranges = []
+    for campaign in config.campaigns.values():
+        col, row = campaign.session_cell[:1], int(campaign.session_cell[1:])
+        ranges.append((f"{campaign.sheet}!{campaign.session_cell}", column_index(col), row))
+
+    cols = [column_index(crit_info.col) for crit_info in config.crit_types.values()]
+    rows_by_sheet: dict[str, list[int]] = {}
+    for char_info in config.characters.values():
+        rows_by_sheet.setdefault(char_info.sheet, []).append(int(char_info.row))
+    for subsheet_id, rows in rows_by_sheet.items():
+        first_col, last_col = column_label(min(cols)), column_label(max(cols))
+        ranges.append(
+            (f"{subsheet_id}!{first_col}{min(rows)}:{last_col}{max(rows)}", min(cols), min(rows))
+        )
+    return ranges
+
+
+class SheetSnapshot:
+    """
+    In-memory index of the tracked cells, keyed by (subsheet, cell).
+
+    The whole index is reloaded with one values.batchGet on refresh(), which runs every ttl
+    seconds once start() is called. Cells changed by the bot are updated in place with set(),
+    and a refresh never overwrites a cell that was set while it was in flight or that is
+    marked dirty (changed locally but not yet written to the sheet).
+
+    Callables in listeners are called with (key, old value or None, new value) whenever a
+    cell's value changes, e.g. to keep stats.CritStats up to date.
+    """
+
+    def __init__(self, sheets: AsyncSheetsHandler, config: Config, ttl: float = 300) -> None:
+        self.sheets = sheets
+        self.sheet_id = sheets.sheet_id
+        self.ttl = ttl
+        self.ranges = snapshot_ranges(config)
+        self.cells = set(tracked_cells(config))
+        self.values: dict[tuple[str, str], int] = {}
+        self.dirty: set[tuple[str, str]] = set()
+        self.loaded_at: float | None = None
+        # Held while refreshing, and by anyone writing dirty cells back to the sheet
+        self.lock = asyncio.Lock()
+        self._version = 0
+        self._touched: dict[tuple[str, str], int] = {}
+        self._refresh_task: asyncio.Task | None = None
+        self.listeners: list[Callable[[tuple[str, str], int | None, int], None]] = []
+
+    def _assign(self, key: tuple[str, str], value: int) -> None:
+        old = self.values.get(key)
+        self.values[key] = value
+        if old != value:
+            for listener in self.listeners:
+                listener(key, old, value)
+
+    @property
+    def fresh(self) -> bool:
+        """Whether the snapshot was loaded less than ttl seconds ago."""
+        return self.loaded_at is not None and time.monotonic() - self.loaded_at < self.ttl
+
+    def get(self, subsheet_id, cell) -> int | None:
+        """Returns the value of a cell, or None if it is unknown or the snapshot is stale."""
+        return self.values.get((subsheet_id, cell)) if self.fresh else None
+
+    def set(self, subsheet_id, cell, value: int, dirty: bool = False) -> None:
+        """
+        Records a new value for a cell.
+
+        :param dirty: True if the value has not been written to the sheet yet
+        """
+        key = (subsheet_id, cell)
+        self._assign(key, value)
+        self._version += 1
+        self._touched[key] = self._version
+        if dirty:
+            self.dirty.add(key)
+
+    async def refresh(self, priority: int = BACKGROUND) -> int:
+        """
+        Reloads every tracked cell from the spreadsheet with one values.batchGet.
+
+        :param priority: The Sheets scheduler priority, INTERACTIVE if a user is waiting on it.
+        :return: The number of cells loaded.
+        """
+        async with self.lock:
+            started = self._version
+            result = await self.sheets.batch_get_values(
+                self.sheet_id, [range_name for range_name, _, _ in self.ranges], priority=priority
+            )
+            if isinstance(result, HttpError):
+                raise result
+
+            loaded = 0
+            for (range_name, first_col, first_row), value_range in zip(
+                self.ranges, result.get("valueRanges", [])
+            ):
+                subsheet_id = range_name.partition("!")[0]
+                for row_offset, row in enumerate(value_range.get("values", [])):
+                    for col_offset, value in enumerate(row):
+                        key = (subsheet_id, f"{column_label(first_col + col_offset)}{first_row + row_offset}")
+                        if key not in self.cells or not value.isdigit():
+                            continue
+                        loaded += 1
+                        if key in self.dirty or self._touched.get(key, 0) > started:
+                            continue
+                        self._assign(key, int(value))
+
+            self.loaded_at = time.monotonic()
+            logging.info(
+                "Snapshot loaded %d of %d tracked cells from %d ranges.",
+                loaded,
+                len(self.cells),
+                len(self.ranges),
+            )
+            return loaded
+
+    async def reconfigure(self, config: Config) -> None:
+        """
+        Switches to the cells tracked by a reloaded config and loads them. Values of cells
+        that are no longer tracked are kept, so any dirty ones still get written back.
+        """
+        async with self.lock:
+            self.ranges = snapshot_ranges(config)
+            self.cells = set(tracked_cells(config))
+        await self.refresh()
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.ttl)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logging.error("Failed to refresh sheet snapshot: %s", e)
+
+    def start(self) -> None:
+        """Starts reloading the snapshot in the background every ttl seconds."""
+        self._refresh_task = asyncio.create_task(self._refresh_loop())
+        logging.info("Sheet snapshot refreshing every %s seconds.", self.ttl)
+
+    def close(self) -> None:
+        """Stops background refreshes."""
+        if self._refresh_task:
+            self._refresh_task.cancel()
+            self._refresh_task = None
@@ -0,0 +1,71 @@
+"""
+Contains the CritStats class, which keeps crit counts per character and totals per campaign sheet
+and crit type in step with the SheetSnapshot, so stats and leaderboards never touch the sheet.
+"""
+
+import heapq
+
+from config import Config
+from snapshot import SheetSnapshot
+
+
+class CritStats:
+    """
+    Crit aggregates, updated incrementally whenever a tracked cell changes in the snapshot
+    (increments, refreshes and the initial bulk read alike).
+    """
+
+    def __init__(self, config: Config, snapshot: SheetSnapshot) -> None:
+        self.snapshot = snapshot
+        self._build(config)
+        snapshot.listeners.append(self.update)
+
+    def _build(self, config: Config) -> None:
+        self.sheets: dict[str, str] = {name: info.sheet for name, info in config.characters.items()}
+        # (subsheet, cell) -> (character, crit type)
+        self.cells: dict[tuple[str, str], tuple[str, str]] = {
+            (char_info.sheet, cell): (name, crit_type)
+            for name, char_info in config.characters.items()
+            for crit_type, cell in char_info.cells.items()
+        }
+        # character -> crit type -> count
+        self.counts: dict[str, dict[str, int]] = {}
+        # (subsheet, crit type) -> character -> count, for leaderboards
+        self.boards: dict[tuple[str, str], dict[str, int]] = {}
+        self.totals: dict[tuple[str, str], int] = {}
+
+        for key, value in self.snapshot.values.items():
+            self.update(key, None, value)
+
+    async def reconfigure(self, config: Config) -> None:
+        """Rebuilds the aggregates from the snapshot for the characters and crit types of a reloaded config."""
+        self._build(config)
+
+    def update(self, key: tuple[str, str], old: int | None, new: int) -> None:
+        """Applies a change of a tracked cell from old (None if it was unknown) to new."""
+        if key not in self.cells:
+            return
+        char_name, crit_type = self.cells[key]
+        board_key = (key[0], crit_type)
+        self.counts.setdefault(char_name, {})[crit_type] = new
+        self.boards.setdefault(board_key, {})[char_name] = new
+        self.totals[board_key] = self.totals.get(board_key, 0) + new - (old or 0)
+
+    def character(self, char_name: str) -> dict[str, int]:
+        """Returns a character's count of each crit type."""
+        return self.counts.get(char_name, {})
+
+    def total(self, sheet: str, crit_type: str) -> int:
+        """Returns the number of crits of a type across all characters on a campaign sheet."""
+        return self.totals.get((sheet, crit_type), 0)
+
+    def leaderboard(self, sheet: str, crit_type: str, n: int = 10) -> list[tuple[str, int]]:
+        """Returns the n characters on a campaign sheet with the most crits of a type, as (name, count)."""
+        board = self.boards.get((sheet, crit_type), {})
+        return heapq.nlargest(n, board.items(), key=lambda entry: entry[1])
+
+    def rank(self, char_name: str, crit_type: str) -> int:
+        """Returns a character's place on their campaign's leaderboard for a crit type, starting at 1."""
+        board = self.boards.get((self.sheets.get(char_name), crit_type), {})
+        count = board.get(char_name, 0)
+        return 1 + sum(1 for other in board.values() if other > count)
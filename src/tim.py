@@ -0,0 +1,301 @@
+"""
+Contains the TimClient class, which sends messages to Tim the cow without blocking the event loop.
+Every call has a deadline after which a stock line is returned instead, and the number of model
+calls in flight at once is capped. Each guild channel gets its own chat session, and the
+HistoryWindow class keeps each session's history within a token budget, so requests do not
+grow for as long as the bot is running.
+"""
+
+import asyncio
+import logging
+import os
+from collections import OrderedDict
+from typing import Hashable
+
+import google.generativeai as genai
+from google.api_core.exceptions import GoogleAPIError
+
+from utils.metrics import metrics
+
+TIMEOUT_RESPONSE = "Tim is lost in thought right now. Ask him again later."
+ERROR_RESPONSE = "Tim is having trouble responding right now."
+DISABLED_RESPONSE = "Tim is disabled right now. Unset NO_TIM to get him back."
+SUMMARY_PREFIX = "Summary of your earlier conversations: "
+CHARS_PER_TOKEN = 4
+# Blocked prompts and stopped candidates are raised as plain Exception subclasses
+TIM_ERRORS = (
+    AttributeError,
+    ValueError,
+    GoogleAPIError,
+    genai.types.StopCandidateException,
+    genai.types.BlockedPromptException,
+)
+
+
+def estimate_tokens(content) -> int:
+    """Roughly estimates the tokens in a history entry, without a count_tokens round trip."""
+    return sum(len(part.text) for part in content.parts) // CHARS_PER_TOKEN + 1
+
+
+class HistoryWindow:
+    """
+    Sliding window over a chat session's history.
+
+    Once the history is estimated to exceed max_tokens, the oldest exchanges (a user message
+    and Tim's reply) are dropped until it fits, always keeping the latest exchange.
+    """
+
+    def __init__(self, max_tokens: int) -> None:
+        self.max_tokens = max_tokens
+
+    @staticmethod
+    def size(tim_chat) -> dict[str, int]:
+        """Returns the number of entries in a chat session's history and their estimated tokens."""
+        history = tim_chat.history
+        return {"entries": len(history), "tokens": sum(map(estimate_tokens, history))}
+
+    def trim(self, tim_chat) -> list:
+        """
+        Drops the oldest exchanges from a chat session's history until it fits the budget.
+
+        :return: The dropped history entries, oldest first.
+        """
+        history = tim_chat.history
+        tokens = sum(map(estimate_tokens, history))
+        keep_from = 0
+        while tokens > self.max_tokens and len(history) - keep_from > 2:
+            tokens -= sum(map(estimate_tokens, history[keep_from:keep_from + 2]))
+            keep_from += 2
+
+        if keep_from:
+            tim_chat.history = history[keep_from:]
+            logging.info(
+                "Trimmed %d entries from Tim's history, ~%d tokens remain.", keep_from, tokens
+            )
+        return history[:keep_from]
+
+
+class CritBatch:
+    """Crit notifications waiting to be sent to Tim as one message, and the future for his reply."""
+
+    def __init__(self) -> None:
+        self.lines: list[str] = []
+        self.reply: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.task: asyncio.Task | None = None
+
+
+class TimSession:
+    """One chat session with Tim, with its own history and send lock."""
+
+    def __init__(self, tim_chat) -> None:
+        self.tim_chat = tim_chat
+        # Sends are serialized so the session's history stays consistent
+        self.lock = asyncio.Lock()
+        self.users = 0
+        self.unsummarized: list = []
+        self.summary_task: asyncio.Task | None = None
+
+    @property
+    def busy(self) -> bool:
+        """Whether the session has a message waiting or is summarizing right now."""
+        return self.users > 0 or self.summary_task is not None
+
+
+class TimClient:
+    """
+    Async client for the Tim model created by app.init_model.
+
+    Chat sessions are created lazily per key (see helpers.get_chat_key), so conversations in
+    different channels neither share history nor wait on each other. At most max_sessions are
+    kept; beyond that the least recently used idle session is evicted. Generation uses the async
+    API, so it never runs on the event loop thread, and at most max_concurrency model calls are
+    in flight at once across all sessions.
+
+    History is trimmed to history_tokens after every exchange. With summarize_history, the
+    trimmed exchanges are summarized in the background and the summary is kept at the start
+    of the history in their place.
+
+    With a crit_batch_window, bursts of crit notifications in a session are sent to Tim as
+    one message (see talk_crit).
+    """
+
+    def __init__(
+        self,
+        model,
+        timeout: float = 8,
+        max_concurrency: int = 2,
+        history_tokens: int = 4000,
+        summarize_history: bool = False,
+        max_sessions: int = 32,
+        crit_batch_window: float = 0,
+    ) -> None:
+        self.model = model
+        self.timeout = timeout
+        self.crit_batch_window = crit_batch_window
+        self._crit_batches: dict[Hashable, CritBatch] = {}
+        self.history = HistoryWindow(history_tokens)
+        self.summarize_history = summarize_history
+        self.max_sessions = max_sessions
+        self.sessions: OrderedDict[Hashable, TimSession] = OrderedDict()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    def session(self, key: Hashable) -> TimSession:
+        """Returns the chat session for a key, starting one if there is none."""
+        if session := self.sessions.get(key):
+            self.sessions.move_to_end(key)
+            return session
+
+        session = TimSession(self.model.start_chat())
+        self.sessions[key] = session
+        logging.info("Started Tim chat session for %s (%d live).", key, len(self.sessions))
+        self._evict(keep=key)
+        return session
+
+    def _evict(self, keep: Hashable) -> None:
+        """Evicts least recently used idle sessions, other than keep, until at most max_sessions remain."""
+        while len(self.sessions) > self.max_sessions:
+            idle = next((k for k, s in self.sessions.items() if k != keep and not s.busy), None)
+            if idle is None:
+                return
+            del self.sessions[idle]
+            logging.info("Evicted Tim chat session for %s.", idle)
+
+    def history_size(self) -> dict[str, int]:
+        """Returns the number of live sessions, and the entries and estimated tokens of their histories."""
+        sizes = [self.history.size(s.tim_chat) for s in self.sessions.values()]
+        return {
+            "sessions": len(sizes),
+            "entries": sum(size["entries"] for size in sizes),
+            "tokens": sum(size["tokens"] for size in sizes),
+        }
+
+    def _report_history_size(self) -> None:
+        """Exports the history size as the tim_sessions and tim_history_* gauges."""
+        size = self.history_size()
+        metrics.set("tim_sessions", size["sessions"])
+        metrics.set("tim_history_entries", size["entries"])
+        metrics.set("tim_history_tokens", size["tokens"])
+
+    async def _send(self, session: TimSession, message: str) -> str:
+        # The channel lock comes first, so calls queued behind a busy channel do not hold global slots
+        async with session.lock, self._semaphore:
+            with metrics.timer("tim"):
+                response = await session.tim_chat.send_message_async(message)
+            dropped = self.history.trim(session.tim_chat)
+        self._report_history_size()
+
+        if dropped and self.summarize_history:
+            session.unsummarized.extend(dropped)
+            if not session.summary_task:
+                session.summary_task = asyncio.create_task(self._summarize(session))
+        return response.text.strip()
+
+    async def _summarize(self, session: TimSession) -> None:
+        """Replaces trimmed history entries with a short summary at the start of the history."""
+        try:
+            dropped, session.unsummarized = session.unsummarized, []
+            transcript = "\n".join(
+                f"{content.role}: {' '.join(part.text for part in content.parts)}"
+                for content in dropped
+            )
+            async with self._semaphore:
+                response = await self.model.generate_content_async(
+                    "Summarize these earlier messages in a few sentences, keeping names and crit "
+                    f"totals. Reply with the summary only.\n{transcript}"
+                )
+            summary = [
+                genai.protos.Content(
+                    role="user", parts=[genai.protos.Part(text=SUMMARY_PREFIX + response.text.strip())]
+                ),
+                genai.protos.Content(role="model", parts=[genai.protos.Part(text="Understood.")]),
+            ]
+
+            async with session.lock:
+                history = session.tim_chat.history
+                if history and history[0].parts[0].text.startswith(SUMMARY_PREFIX):
+                    history = history[2:]
+                session.tim_chat.history = summary + history
+            self._report_history_size()
+            logging.info("Summarized %d trimmed entries of Tim's history.", len(dropped))
+        except TIM_ERRORS as e:
+            logging.error("Failed to summarize Tim's history: %s", e)
+        finally:
+            session.summary_task = None
+
+    async def _generate(self, key: Hashable, prompt: str) -> str:
+        """Sends a prompt to a chat session within the deadline, falling back to a stock line."""
+        session = self.session(key)
+        session.users += 1
+        try:
+            response = await asyncio.wait_for(self._send(session, prompt), self.timeout)
+            logging.info("Received response from Tim: %s", response)
+            return response
+        except asyncio.TimeoutError:
+            metrics.inc("tim_timeouts")
+            logging.warning("Tim did not respond within %s seconds.", self.timeout)
+            return TIMEOUT_RESPONSE
+        except TIM_ERRORS as e:
+            metrics.inc("tim_errors")
+            logging.error("Error communicating with Tim: %s", e)
+            return ERROR_RESPONSE
+        finally:
+            session.users -= 1
+
+    async def talk(self, message: str, name: str, key: Hashable = None) -> str:
+        """
+        Sends a message to Tim and returns his response.
+        :param message: The message to send to Tim.
+        :param name: The name of the person sending the message.
+        :param key: Which chat session to use, e.g. from helpers.get_chat_key.
+        :return: Tim's response text with newline stripped, or a stock line if he
+            does not answer within the deadline.
+
+        Note: If the environment variable "NO_TIM" is set (to any value) then the A.I.
+        model will not be run and a stock response will be returned.
+        """
+        if os.getenv("NO_TIM"): return DISABLED_RESPONSE
+
+        logging.info("Sending message to Tim: '%s' from user '%s'.", message, name)
+        return await self._generate(key, f"From {name}: {message}")
+
+    async def talk_crit(self, message: str, name: str, key: Hashable = None) -> str:
+        """
+        Notifies Tim of a crit and returns his response. Notifications for the same session that
+        arrive within crit_batch_window seconds of each other are sent as one message, and every
+        caller gets Tim's single reply to all of them.
+        :param message: The crit notification to send to Tim.
+        :param name: The name of the person who recorded the crit.
+        :param key: Which chat session to use, e.g. from helpers.get_chat_key.
+        :return: Tim's response text with newline stripped, or a stock line if he
+            does not answer within the deadline.
+        """
+        if self.crit_batch_window <= 0:
+            return await self.talk(message, name, key)
+        if os.getenv("NO_TIM"): return DISABLED_RESPONSE
+
+        logging.info("Queueing crit notification for Tim: '%s' from user '%s'.", message, name)
+        batch = self._crit_batches.get(key)
+        if batch is None:
+            batch = CritBatch()
+            self._crit_batches[key] = batch
+            batch.task = asyncio.create_task(self._send_crit_batch(key, batch))
+        batch.lines.append(f"From {name}: {message}")
+        # Shielded so that one caller giving up does not cancel the reply for the others
+        return await asyncio.shield(batch.reply)
+
+    async def _send_crit_batch(self, key: Hashable, batch: "CritBatch") -> None:
+        reply = ERROR_RESPONSE
+        try:
+            await asyncio.sleep(self.crit_batch_window)
+            del self._crit_batches[key]
+            if len(batch.lines) > 1:
+                logging.info("Coalesced %d crit notifications into one message to Tim.", len(batch.lines))
+            reply = await self._generate(key, "\n".join(batch.lines))
+        except Exception as e:
+            metrics.inc("tim_errors")
+            logging.error("Failed to send crit notifications to Tim: %s", e)
+        finally:
+            # Every caller in the batch is waiting on this, so it must resolve even on errors
+            if self._crit_batches.get(key) is batch:
+                del self._crit_batches[key]
+            batch.reply.set_result(reply)
@@ -0,0 +1,184 @@
+"""
+Contains the SoundCache class, which decodes crit sounds to raw PCM once and plays them from memory,
+so that playing a sound does not spawn FFmpeg or decode the file again, and the MixerSource class,
+which lets several of those sounds play in one voice channel at the same time.
+"""
+
+import asyncio
+import logging
+import os
+import subprocess
+import threading
+from array import array
+from collections import OrderedDict
+
+import discord
+from discord.opus import Encoder
+
+FRAME_SIZE = Encoder.FRAME_SIZE
+
+
+def decode(sound: str) -> bytes:
+    """
+    Decodes a sound file to the 48kHz 16-bit stereo PCM that discord.py sends to voice.
+
+    :param sound: The path to the sound file to decode.
+    :return: The decoded PCM data.
+    """
+    result = subprocess.run(
+        args=[
+            "ffmpeg", "-loglevel", "error", "-i", sound,
+            "-f", "s16le", "-ar", str(Encoder.SAMPLING_RATE), "-ac", str(Encoder.CHANNELS), "pipe:1",
+        ],
+        capture_output=True,
+        check=True,
+    )
+    return result.stdout
+
+
+class PCMBufferSource(discord.AudioSource):
+    """Audio source that plays decoded PCM data from memory, one 20ms frame per read."""
+
+    def __init__(self, pcm: bytes) -> None:
+        self.pcm = memoryview(pcm)
+        self.pos = 0
+
+    def read(self) -> bytes:
+        frame = self.pcm[self.pos:self.pos + FRAME_SIZE]
+        self.pos += FRAME_SIZE
+        if not frame:
+            return b""
+        # The last frame is padded with silence, since voice expects whole frames
+        return bytes(frame).ljust(FRAME_SIZE, b"\0")
+
+    def is_opus(self) -> bool:
+        return False
+
+
+def mix(frames: list[bytes]) -> bytes:
+    """
+    Sums 16-bit PCM frames sample by sample, clipping the result to the 16-bit range.
+
+    :param frames: Frames of equal length to mix.
+    :return: The mixed frame.
+    """
+    total = list(map(sum, zip(*(array("h", frame) for frame in frames))))
+    if max(total) > 32767 or min(total) < -32768:
+        total = [32767 if x > 32767 else -32768 if x < -32768 else x for x in total]
+    return array("h", total).tobytes()
+
+
+class MixerSource(discord.AudioSource):
+    """
+    Audio source that plays every added source at once ("mix" mode) or one after
+    another ("queue" mode). At most max_streams sources are held; further sources are
+    dropped until one finishes. Reads happen on the voice player thread, so access to
+    the streams is locked.
+    """
+
+    def __init__(self, mode: str = "mix", max_streams: int = 4) -> None:
+        if mode not in ("mix", "queue"):
+            raise ValueError(f"Invalid mixer mode '{mode}'")
+        self.mode = mode
+        self.max_streams = max_streams
+        self._streams: list[discord.AudioSource] = []
+        self._lock = threading.Lock()
+
+    @property
+    def active(self) -> bool:
+        """Whether any sources are still playing or waiting to play."""
+        with self._lock:
+            return bool(self._streams)
+
+    def add(self, source: discord.AudioSource) -> bool:
+        """
+        Adds a source to the mix or the end of the queue.
+
+        :return: False if the source was dropped because max_streams are already held.
+        """
+        with self._lock:
+            if len(self._streams) >= self.max_streams:
+                return False
+            self._streams.append(source)
+            return True
+
+    def read(self) -> bytes:
+        frames = []
+        with self._lock:
+            for stream in list(self._streams):
+                if frame := stream.read():
+                    frames.append(frame)
+                    if self.mode == "queue":
+                        break
+                else:
+                    self._streams.remove(stream)
+
+        if len(frames) < 2:
+            return frames[0] if frames else b""
+        return mix(frames)
+
+    def is_opus(self) -> bool:
+        return False
+
+
+class SoundCache:
+    """
+    LRU cache of decoded sounds, keyed by path and capped at max_bytes of PCM.
+    A sound is decoded again if its file has changed since it was cached.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self._sounds: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+        self._size = 0
+
+    def _evict(self, sound: str) -> None:
+        _, pcm = self._sounds.pop(sound)
+        self._size -= len(pcm)
+
+    async def load(self, sound: str) -> bytes:
+        """
+        Decodes a sound in a worker thread and caches it, evicting the least recently used
+        sounds if the cache grows past its cap.
+
+        :param sound: The path to the sound file to load.
+        :return: The decoded PCM data.
+        """
+        mtime = os.path.getmtime(sound)
+        pcm = await asyncio.to_thread(decode, sound)
+        if sound in self._sounds:
+            self._evict(sound)
+        self._sounds[sound] = (mtime, pcm)
+        self._size += len(pcm)
+        while self._size > self.max_bytes and len(self._sounds) > 1:
+            evicted = next(iter(self._sounds))
+            self._evict(evicted)
+            logging.info("Evicted sound '%s' from the sound cache.", evicted)
+        logging.info("Sound '%s' decoded and cached (%d bytes).", sound, len(pcm))
+        return pcm
+
+    async def source(self, sound: str) -> PCMBufferSource:
+        """
+        Returns a fresh audio source for a sound, decoding it only if it is not cached.
+
+        :param sound: The path to the sound file to play.
+        """
+        cached = self._sounds.get(sound)
+        if cached and cached[0] == os.path.getmtime(sound):
+            self._sounds.move_to_end(sound)
+            return PCMBufferSource(cached[1])
+        return PCMBufferSource(await self.load(sound))
+
+    async def sync(self, sounds: list[str]) -> None:
+        """
+        Makes the cache hold exactly the given sounds, dropping any others and decoding new ones.
+
+        :param sounds: The paths of the sounds that can be played.
+        """
+        for sound in [s for s in self._sounds if s not in sounds]:
+            self._evict(sound)
+        for sound in sounds:
+            try:
+                await self.source(sound)
+            except (OSError, subprocess.CalledProcessError) as e:
+                logging.error("Failed to load sound '%s': %s", sound, e)
@@ -0,0 +1,112 @@
+"""
+Pure-Python cowsay renderer, producing the same output as `cowsay -f ./wizard.cow [-e<eyes>] <message>`
+without spawning a process for every message.
+
+Like cowsay itself, wrapping and padding work on the UTF-8 bytes of the message, so lines
+containing multibyte characters are measured the same way the Perl implementation measures them.
+"""
+
+import re
+from functools import lru_cache
+
+WRAP_COLUMNS = 40
+DEFAULT_EYES = "oo"
+DEFAULT_TONGUE = "  "
+
+# Perl's \s on byte strings
+_WS = rb"[ \t\n\r\f\v]"
+_PARAGRAPH_BREAK = re.compile(rb"\n" + _WS + rb"+")
+_WS_RUN = re.compile(_WS + rb"+")
+_WRAP_DONE = re.compile(_WS + rb"*\Z")
+_WRAP_LINE = re.compile(rb"([^\n]{0,%d})(%s|\n+|\Z)" % (WRAP_COLUMNS - 1, _WS))
+_WRAP_HARD = re.compile(rb"([^\n]{%d})" % (WRAP_COLUMNS - 1))
+_HEREDOC = re.compile(r"<<\s*(\"?)(\w+)\1\s*;[^\n]*\n(.*?)^\2$", re.DOTALL | re.MULTILINE)
+_INTERPOLATION = re.compile(r"\\(.)|\$\{(\w+)}|\$(\w+)", re.DOTALL)
+_ESCAPES = {"n": "\n", "t": "\t"}
+
+
+@lru_cache(maxsize=None)
+def load_cow(cow_file: str) -> str:
+    """
+    Reads the heredoc assigned to $the_cow in a .cow file.
+
+    :param cow_file: Path to the .cow file.
+    :return: The cow template, with $thoughts, $eyes and $tongue left to substitute.
+    """
+    with open(cow_file, encoding="UTF-8") as f:
+        match = _HEREDOC.search(f.read())
+    if not match:
+        raise ValueError(f"No $the_cow heredoc found in {cow_file}")
+    return match.group(3)
+
+
+def _interpolate(template: str, variables: dict[str, str]) -> str:
+    """Expands Perl double-quoted string escapes and $variables in a single pass."""
+
+    def replace(match: re.Match) -> str:
+        if match.group(1) is not None:
+            return _ESCAPES.get(match.group(1), match.group(1))
+        return variables.get(match.group(2) or match.group(3), "")
+
+    return _INTERPOLATION.sub(replace, template)
+
+
+def _wrap(text: bytes) -> bytes:
+    """Wraps one paragraph the way Text::Wrap::wrap does with $columns = WRAP_COLUMNS."""
+    wrapped = b""
+    separator = b""
+    remainder = b""
+    pos = 0
+    while not _WRAP_DONE.match(text, pos):
+        if match := _WRAP_LINE.match(text, pos):
+            remainder = match.group(2)
+        else:
+            # A single word longer than the line, so it is split mid-word
+            match = _WRAP_HARD.match(text, pos)
+            remainder = b"\n"
+        wrapped += separator + match.group(1)
+        separator = b"\n"
+        pos = match.end()
+    return wrapped + remainder
+
+
+def _fill(message: bytes) -> list[bytes]:
+    """Splits a message into balloon lines the way Text::Wrap::fill does."""
+    paragraphs = _PARAGRAPH_BREAK.split(message)
+    while paragraphs and not paragraphs[-1]:
+        paragraphs.pop()
+    filled = b"\n\n".join(_wrap(_WS_RUN.sub(b" ", p)) for p in paragraphs)
+    lines = filled.split(b"\n")
+    while lines and not lines[-1]:
+        lines.pop()
+    return lines or [b""]
+
+
+def _balloon(lines: list[bytes]) -> bytes:
+    width = max(len(line) for line in lines)
+    if len(lines) < 2:
+        borders = [(b"<", b">")]
+    else:
+        borders = [(b"/", b"\\")] + [(b"|", b"|")] * (len(lines) - 2) + [(b"\\", b"/")]
+
+    balloon = b" " + b"_" * (width + 2) + b" \n"
+    for (left, right), line in zip(borders, lines):
+        balloon += left + b" " + line.ljust(width) + b" " + right + b"\n"
+    return balloon + b" " + b"-" * (width + 2) + b" \n"
+
+
+@lru_cache(maxsize=256)
+def render(message: str, eyes: str = DEFAULT_EYES, cow_file: str = "./wizard.cow") -> str:
+    """
+    Renders a message as a cow saying it.
+
+    :param message: The message to format.
+    :param eyes: The eye string, length 2.
+    :param cow_file: Path to the .cow file to draw.
+    :return: The formatted message, identical to cowsay's output.
+    """
+    cow = _interpolate(
+        load_cow(cow_file), {"thoughts": "\\", "eyes": eyes, "tongue": DEFAULT_TONGUE}
+    )
+    balloon = _balloon(_fill(message.encode("UTF-8")))
+    return balloon.decode("UTF-8", errors="replace") + cow
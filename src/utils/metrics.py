@@ -0,0 +1,147 @@
+"""
+Contains the Metrics class, which times the stages of handling a command (Sheets reads and
+writes, Tim calls, cowsay renders, Discord sends, ...) and counts notable events, and a small
+HTTP server that exposes them in the Prometheus text format.
+"""
+
+import logging
+import math
+import threading
+import time
+from collections import deque
+
+from aiohttp import web
+
+
+class Histogram:
+    """Durations in seconds of one stage: the latest window samples, plus all-time count and sum."""
+
+    def __init__(self, window: int) -> None:
+        self.samples: deque[float] = deque(maxlen=window)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.samples.append(seconds)
+        self.count += 1
+        self.sum += seconds
+
+    def quantile(self, q: float) -> float:
+        """Returns the nearest-rank quantile of the rolling window, or 0 if it is empty."""
+        ordered = sorted(self.samples)
+        if not ordered:
+            return 0.0
+        return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+class Metrics:
+    """
+    Thread-safe registry of stage histograms, event counters and gauges.
+
+    Stages are timed with timer() or observe(); histograms keep a rolling window of the most
+    recent samples, so quantiles reflect current behaviour rather than the whole uptime.
+    """
+
+    QUANTILES = (0.5, 0.95, 0.99)
+
+    def __init__(self, window: int = 1000) -> None:
+        self.window = window
+        self.histograms: dict[str, Histogram] = {}
+        self.counters: dict[str, int] = {}
+        self.gauges: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float) -> None:
+        """Records a duration for a stage."""
+        with self._lock:
+            histogram = self.histograms.get(stage)
+            if not histogram:
+                histogram = self.histograms[stage] = Histogram(self.window)
+            histogram.observe(seconds)
+
+    def inc(self, name: str, amount: int = 1) -> None:
+        """Adds amount to a counter."""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def set(self, name: str, value: float) -> None:
+        """Sets a gauge to its current value."""
+        with self._lock:
+            self.gauges[name] = value
+
+    def timer(self, stage: str) -> "Timer":
+        """Returns a context manager that records the duration of its body as a stage."""
+        return Timer(self, stage)
+
+    def summary(self) -> str:
+        """Formats the stage quantiles in milliseconds, the counters and the gauges as a plain text table."""
+        with self._lock:
+            lines = [f"{'stage':<26} {'n':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"]
+            for stage, histogram in sorted(self.histograms.items()):
+                lines.append(
+                    f"{stage:<26} {histogram.count:>7} "
+                    + " ".join(f"{histogram.quantile(q) * 1000:>8.1f}" for q in self.QUANTILES)
+                )
+            lines.extend(f"{name:<26} {count:>7}" for name, count in sorted(self.counters.items()))
+            lines.extend(f"{name:<26} {value:>7g}" for name, value in sorted(self.gauges.items()))
+        return "\n".join(lines)
+
+    def render(self) -> str:
+        """Formats every metric in the Prometheus text exposition format."""
+        with self._lock:
+            lines = [
+                "# HELP crit_bot_stage_seconds Time spent in each stage of handling a command.",
+                "# TYPE crit_bot_stage_seconds summary",
+            ]
+            for stage, histogram in sorted(self.histograms.items()):
+                lines.extend(
+                    f'crit_bot_stage_seconds{{stage="{stage}",quantile="{q}"}} {histogram.quantile(q)}'
+                    for q in self.QUANTILES
+                )
+                lines.append(f'crit_bot_stage_seconds_sum{{stage="{stage}"}} {histogram.sum}')
+                lines.append(f'crit_bot_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+            for name, count in sorted(self.counters.items()):
+                lines.append(f"# TYPE crit_bot_{name}_total counter")
+                lines.append(f"crit_bot_{name}_total {count}")
+            for name, value in sorted(self.gauges.items()):
+                lines.append(f"# TYPE crit_bot_{name} gauge")
+                lines.append(f"crit_bot_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class Timer:
+    """Context manager recording the duration of its body, including any awaits, as a stage."""
+
+    def __init__(self, metrics: Metrics, stage: str) -> None:
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.stage, time.perf_counter() - self.start)
+
+
+metrics = Metrics()
+
+
+async def start_server(host: str, port: int) -> web.AppRunner:
+    """
+    Serves the metrics at http://host:port/metrics until the returned runner is cleaned up.
+
+    :param host: The address to listen on. Keep this local unless the port is firewalled.
+    :param port: The port to listen on.
+    """
+
+    async def handle(request: web.Request) -> web.Response:
+        return web.Response(text=metrics.render(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logging.info("Metrics served at http://%s:%d/metrics.", host, port)
+    return runner
@@ -0,0 +1,69 @@
+"""
+Contains the SamplingProfiler class, which profiles the running bot by periodically sampling the
+stack of the event loop thread, so it can be used on the live process without slowing it down much.
+"""
+
+import os
+import sys
+import time
+from collections import Counter
+
+
+# Files whose frame on top of the stack means the thread is waiting for work, not doing any
+IDLE_FILES = {"selectors.py", "threading.py", "queue.py"}
+
+
+def frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """
+    Samples the stack of one thread, normally the event loop's, every interval seconds, counting
+    how often each stack and each function was seen. Samples taken while the thread waits for
+    work (in a selector, lock or queue) are only counted as idle, so top() and collapsed() show
+    where the thread spends its time when it is busy.
+    """
+
+    def __init__(self, thread_id: int, interval: float = 0.005) -> None:
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = 0
+        self.idle = 0
+        self.stacks: Counter[str] = Counter()
+        self.own: Counter[str] = Counter()
+        self.total: Counter[str] = Counter()
+
+    def run(self, seconds: float) -> None:
+        """Samples for the given number of seconds. Blocks, so run it in a worker thread."""
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                break
+            self.samples += 1
+            if os.path.basename(frame.f_code.co_filename) in IDLE_FILES:
+                self.idle += 1
+            else:
+                stack = []
+                while frame:
+                    stack.append(frame_name(frame))
+                    frame = frame.f_back
+                stack.reverse()
+                self.stacks[";".join(stack)] += 1
+                self.own[stack[-1]] += 1
+                self.total.update(set(stack))
+            time.sleep(self.interval)
+
+    def top(self, n: int = 15) -> str:
+        """Formats the n functions seen in the most samples, with how often they were on top of the stack."""
+        samples = max(self.samples, 1)
+        lines = [f"{self.samples} samples, {self.idle * 100 / samples:.1f}% idle. own% total% function"]
+        for name, count in self.total.most_common(n):
+            lines.append(f"{self.own[name] * 100 / samples:5.1f} {count * 100 / samples:6.1f} {name}")
+        return "\n".join(lines)
+
+    def collapsed(self) -> str:
+        """Returns the samples in the collapsed stack format read by flamegraph.pl and speedscope."""
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common()) + "\n"
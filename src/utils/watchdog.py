@@ -0,0 +1,81 @@
+"""
+Contains the LoopWatchdog class, which measures event loop lag continuously and, when the loop
+is blocked for too long, logs the stack of the code blocking it and the command being run.
+"""
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+import weakref
+
+from utils.metrics import metrics
+
+# What each task is doing, e.g. "/add from 'Derek'", for naming the culprit of a stall
+task_labels: "weakref.WeakKeyDictionary[asyncio.Task, str]" = weakref.WeakKeyDictionary()
+
+
+def label_current_task(label: str) -> None:
+    """Labels the running task, so stalls caused by it are reported with the label."""
+    if task := asyncio.current_task():
+        task_labels[task] = label
+
+
+class LoopWatchdog:
+    """
+    A heartbeat callback on the event loop records the time every interval seconds, and the
+    lag between when it was due and when it ran. A daemon thread checks the heartbeat, and
+    once it is threshold seconds overdue, logs the event loop thread's current stack once
+    per stall. Both only do a clock read per interval, so the watchdog can stay on.
+    """
+
+    def __init__(self, interval: float = 0.1, threshold: float = 0.5) -> None:
+        self.interval = interval
+        self.threshold = threshold
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._loop_thread_id: int | None = None
+        self._beat = 0.0
+        self._handle: asyncio.TimerHandle | None = None
+        self._stopped = threading.Event()
+
+    def start(self) -> None:
+        """Starts the heartbeat on the running event loop and the watchdog thread."""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._handle = self._loop.call_later(self.interval, self._heartbeat, self._beat + self.interval)
+        threading.Thread(target=self._watch, name="loop-watchdog", daemon=True).start()
+        logging.info("Loop watchdog reporting stalls over %s seconds.", self.threshold)
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._handle:
+            self._handle.cancel()
+
+    def _heartbeat(self, due: float) -> None:
+        self._beat = now = time.monotonic()
+        lag = now - due
+        metrics.observe("loop_lag", lag)
+        if lag >= self.threshold:
+            logging.warning("Event loop was blocked for %.2f seconds.", lag)
+        self._handle = self._loop.call_later(self.interval, self._heartbeat, now + self.interval)
+
+    def _watch(self) -> None:
+        reported = None
+        while not self._stopped.wait(self.interval):
+            beat = self._beat
+            if beat == reported or time.monotonic() - beat < self.threshold:
+                continue
+            reported = beat
+            metrics.inc("loop_stalls")
+
+            frame = sys._current_frames().get(self._loop_thread_id)
+            task = asyncio.current_task(self._loop)
+            logging.warning(
+                "Event loop blocked for over %s seconds while running %s. Blocking code:\n%s",
+                self.threshold,
+                task_labels.get(task) or (task.get_name() if task else "a callback"),
+                "".join(traceback.format_stack(frame)) if frame else "(no stack)",
+            )
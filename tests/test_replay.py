@@ -0,0 +1,72 @@
+"""
+Tests for WriteBehindCounter.replay, run from the repository root with `python -m pytest tests`.
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from config import Config
+from counters import WriteBehindCounter
+from journal import CritJournal
+from snapshot import SheetSnapshot
+
+
+class FakeSheets:
+    """Stands in for AsyncSheetsHandler, holding one value per (subsheet, cell)."""
+
+    sheet_id = "sheet"
+
+    def __init__(self, cells: dict[tuple[str, str], int]) -> None:
+        self.cells = cells
+
+    async def get_values(self, spreadsheet_id, subsheet_id, range_name, priority=None):
+        return {"values": [[str(self.cells[(subsheet_id, range_name)])]]}
+
+    async def batch_update_values(self, spreadsheet_id, data: dict[str, list], priority=None):
+        for range_name, values in data.items():
+            subsheet_id, _, cell = range_name.partition("!")
+            self.cells[(subsheet_id, cell)] = values[0][0]
+        return {}
+
+
+def replay(tmp_path, sheet_value: int, events: list[tuple[int, int]]) -> tuple[int, int]:
+    """Journals events for one cell, replays them onto a sheet showing sheet_value and returns (replayed, value)."""
+
+    async def run() -> tuple[int, int]:
+        sheets = FakeSheets({("Paxorian", "B2"): sheet_value})
+        journal = CritJournal(str(tmp_path / "crits.db"))
+        try:
+            for amount, value in events:
+                await journal.append("Paxorian", "B2", amount, value)
+            counter = WriteBehindCounter(sheets, SheetSnapshot(sheets, Config({})), journal=journal)
+            replayed = await counter.replay()
+            assert await journal.pending() == {}
+            return replayed, sheets.cells[("Paxorian", "B2")]
+        finally:
+            journal.close()
+
+    return asyncio.run(run())
+
+
+def test_replay_applies_events_missing_from_the_sheet(tmp_path):
+    assert replay(tmp_path, 3, [(1, 4), (1, 5)]) == (2, 5)
+
+
+def test_replay_skips_events_already_on_the_sheet(tmp_path):
+    assert replay(tmp_path, 5, [(1, 4), (1, 5)]) == (0, 5)
+
+
+def test_replay_ignores_journal_order(tmp_path):
+    # Concurrent increments can commit out of order, so the event for 4 comes after the one for 5
+    assert replay(tmp_path, 5, [(1, 5), (1, 4)]) == (0, 5)
+
+
+def test_replay_applies_out_of_order_events_missing_from_the_sheet(tmp_path):
+    assert replay(tmp_path, 3, [(1, 5), (1, 4)]) == (2, 5)
+
+
+def test_replay_handles_bulk_amounts(tmp_path):
+    assert replay(tmp_path, 2, [(3, 5), (1, 6)]) == (2, 6)